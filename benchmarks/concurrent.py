@@ -0,0 +1,63 @@
+# Throughput of counting from several threads into one shared multiset, with
+# a multiset behind one global lock against the sharded concurrent_multiset,
+# adding one element at a time and in batches.
+#
+#     PYTHONPATH=. python benchmarks/concurrent.py [elements per thread]
+#
+# On interpreters with a global interpreter lock threads don't run Python
+# code in parallel, so only the lock contention differs; free-threaded
+# builds show the scaling of the shards.
+import random
+import sys
+import threading
+import timeit
+
+from more_collections import multiset, concurrent_multiset
+
+BATCH = 1000
+
+def locked_add(ms, lock, data):
+    for x in data:
+        with lock:
+            ms.add(x)
+
+def locked_update(ms, lock, data):
+    for i in range(0, len(data), BATCH):
+        with lock:
+            ms.update(data[i:i + BATCH])
+
+def sharded_add(ms, lock, data):
+    add = ms.add
+    for x in data:
+        add(x)
+
+def sharded_update(ms, lock, data):
+    for i in range(0, len(data), BATCH):
+        ms.update(data[i:i + BATCH])
+
+def run(worker, constructor, threads, per_thread):
+    rnd = random.Random(0)
+    data = [[rnd.randrange(10000) for _ in range(per_thread)] for _ in range(threads)]
+    ms, lock = constructor(), threading.Lock()
+    workers = [threading.Thread(target=worker, args=(ms, lock, d)) for d in data]
+    start = timeit.default_timer()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    elapsed = timeit.default_timer() - start
+    assert len(ms) == threads * per_thread
+    return threads * per_thread / elapsed
+
+def main(per_thread=200000):
+    cases = (('multiset + lock, add', locked_add, multiset),
+        ('multiset + lock, update', locked_update, multiset),
+        ('concurrent_multiset, add', sharded_add, concurrent_multiset),
+        ('concurrent_multiset, update', sharded_update, concurrent_multiset))
+    print('%-30s' % 'elements/s' + ''.join('%12s' % ('%d threads' % t) for t in (1, 2, 4, 8)))
+    for name, worker, constructor in cases:
+        print('%-30s' % name + ''.join('%12.0f' % run(worker, constructor, t, per_thread)
+            for t in (1, 2, 4, 8)))
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,30 @@
+# Memory per object of many small multisets, as used for keys of other
+# structures, compared to collections.Counter and frozenset.
+#
+#     PYTHONPATH=. python benchmarks/memory.py [objects]
+import random
+import sys
+import tracemalloc
+from collections import Counter
+
+from more_collections import multiset, frozenmultiset, orderable_frozenmultiset
+
+def bytes_per_object(constructor, data):
+    tracemalloc.start()
+    objects = [constructor(d) for d in data]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return size / len(objects)
+
+def main(objects=100000):
+    rnd = random.Random(0)
+    constructors = (multiset, frozenmultiset, orderable_frozenmultiset, Counter, frozenset)
+    print('distinct ' + ''.join('%26s' % c.__name__ for c in constructors))
+    for distinct in (1, 4, 8, 32):
+        data = [[e for e in rnd.sample(range(1000), distinct) for _ in range(rnd.randint(1, 3))]
+            for _ in range(objects)]
+        row = (bytes_per_object(c, data) for c in constructors)
+        print('%8d ' % distinct + ''.join('%26.0f' % b for b in row))
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,97 @@
+# Runs the cases of suite.py at a range of scales and prints one line per
+# case and scale, the best time of a few repeats (or bytes per element for
+# memory cases). Results can be saved as a baseline and later runs compared
+# against it, reporting the cases that got slower.
+#
+#     PYTHONPATH=. python benchmarks/run.py [--scales 3 4 5] [--only puredict]
+#         [--save benchmarks/baseline.json] [--compare benchmarks/baseline.json]
+#
+# Scales are powers of ten; the default stops at 10^5 to finish in about a
+# minute, the full range 3 to 7 takes long and needs a few GB of memory.
+import argparse
+import gc
+import json
+import sys
+import timeit
+
+from suite import CASES
+
+MIN_TIME = 0.01
+
+def loops(run):
+    # number of runs of a fast case that take at least MIN_TIME, so their
+    # time isn't mostly timer noise
+    number = 1
+    while timeit.timeit(run, number=number) < MIN_TIME:
+        number *= 2
+    return number
+
+def measure(f, n, repeat):
+    prepared = f(n)
+    if not callable(prepared) and not isinstance(prepared, tuple):
+        return prepared
+    if isinstance(prepared, tuple):
+        setup, run = prepared
+        timer = lambda state: timeit.timeit(lambda: run(state), number=1)
+    else:
+        setup, number = lambda: None, loops(prepared)
+        timer = lambda _: timeit.timeit(prepared, number=number) / number
+    best = float('inf')
+    for _ in range(repeat):
+        state = setup()
+        gc.collect()
+        best = min(best, timer(state))
+    return best
+
+def key(group, name, subject, n):
+    return '%s/%s/%s/1e%d' % (group, name, subject, n)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scales', type=int, nargs='+', default=[3, 4, 5])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--only', nargs='+', default=[],
+        help='run only cases whose group, name or subject is given')
+    parser.add_argument('--save', help='write the results to this json file')
+    parser.add_argument('--compare', help='compare with results saved earlier')
+    parser.add_argument('--threshold', type=float, default=1.5,
+        help='slowdown against the baseline reported as a regression')
+    args = parser.parse_args(argv)
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+    results, ratios = {}, {}
+    for scale in args.scales:
+        for group, name, subject, memory, f in CASES:
+            if args.only and not set(args.only) & set((group, name, subject)):
+                continue
+            k = key(group, name, subject, scale)
+            value = results[k] = measure(f, 10 ** scale, 1 if memory else args.repeat)
+            line = '%-60s %12.1f B' % (k, value) if memory else '%-60s %12.6f s' % (k, value)
+            if baseline.get(k):
+                ratios[k] = value / baseline[k]
+                line += '  %5.2fx' % ratios[k]
+            print(line)
+            sys.stdout.flush()
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({'python': sys.version.split()[0], 'results': results},
+                f, indent=1, sort_keys=True)
+    if ratios:
+        # a machine that is uniformly slower than the one the baseline was
+        # taken on shifts all ratios, so regressions are relative to the median
+        median = sorted(ratios.values())[len(ratios) // 2]
+        regressions = [(k, r / median) for (k, r) in sorted(ratios.items())
+            if r / median > args.threshold]
+        print('\nmedian ratio to %s: %.2fx, %d regressions relative to it'
+            % (args.compare, median, len(regressions)))
+        for k, ratio in regressions:
+            print('%-60s %5.2fx' % (k, ratio))
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,214 @@
+# Benchmark cases for the multisets and puredict, each next to the stdlib
+# structure that does the same job (collections.Counter, dict, frozenset).
+#
+# A case is registered with @case(group, subject) and is a function of the
+# scale n that returns either a function to time, or a pair of a setup
+# function and a function that takes the setup's result, if every run needs
+# fresh state (e.g. because the result would otherwise be cached).
+# Memory cases return the number of bytes per element instead.
+import pickle
+import random
+import tracemalloc
+from collections import Counter
+from functools import partial
+
+from more_collections import puredict
+from more_collections.multisets import multiset, frozenmultiset, \
+    orderable_multiset, orderable_frozenmultiset, \
+    nestable_orderable_frozenmultiset, sort_key
+try:
+    from more_collections.int_multisets import int_multiset, int_frozenmultiset
+except ImportError: # numpy is optional
+    int_multiset = int_frozenmultiset = None
+
+CASES = []
+
+def case(group, subject, memory=False):
+    def register(f):
+        CASES.append((group, f.__name__, subject, memory, f))
+        return f
+    return register
+
+PROBES = 1000
+
+def elements(n, seed=0):
+    # n ints with about n / 4 distinct values, like a histogram
+    rnd = random.Random(seed)
+    return [rnd.randrange(max(n // 4, 1)) for _ in range(n)]
+
+def probes(n):
+    rnd = random.Random(1)
+    return [rnd.randrange(max(n // 2, 1)) for _ in range(PROBES)]
+
+def bytes_per_element(build, n):
+    tracemalloc.start()
+    obj = build()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del obj
+    return size / float(n)
+
+def multiset_classes():
+    classes = [multiset, frozenmultiset, orderable_multiset,
+        orderable_frozenmultiset, nestable_orderable_frozenmultiset]
+    if int_multiset is not None:
+        classes += [int_multiset, int_frozenmultiset]
+    return classes
+
+def counts_of(c):
+    # Counter and the multisets count the same way
+    return c.count if hasattr(c, 'count') and not isinstance(c, Counter) else c.__getitem__
+
+# multisets and their baselines
+
+for c in multiset_classes() + [Counter, frozenset]:
+    name = c.__name__
+
+    @case('multiset', name)
+    def construct(n, c=c):
+        data = elements(n)
+        return partial(c, data)
+
+    @case('multiset', name)
+    def lookup(n, c=c):
+        ms, xs = c(elements(n)), probes(n)
+        if c is frozenset:
+            return lambda: [x in ms for x in xs]
+        count = counts_of(ms)
+        return lambda: [count(x) for x in xs]
+
+    @case('multiset', name)
+    def iterate(n, c=c):
+        ms = c(elements(n))
+        if c is Counter:
+            return lambda: list(ms.elements())
+        return partial(list, ms)
+
+    @case('multiset', name, memory=True)
+    def memory(n, c=c):
+        data = elements(n)
+        return bytes_per_element(partial(c, data), n)
+
+    for op in ('add', 'sub', 'or', 'and', 'xor'):
+        if (c is Counter and op == 'xor') or (c is frozenset and op == 'add'):
+            continue
+        def algebra(n, c=c, op='__%s__' % op):
+            a, b = c(elements(n)), c(elements(n, seed=2))
+            return partial(getattr(a, op), b)
+        algebra.__name__ = 'algebra_' + op
+        case('multiset', name)(algebra)
+
+    if c not in (Counter, frozenset):
+        @case('multiset', name)
+        def equal(n, c=c):
+            a, b = c(elements(n)), c(elements(n))
+            return partial(a.__eq__, b)
+
+for c in (frozenmultiset, orderable_frozenmultiset, nestable_orderable_frozenmultiset,
+        int_frozenmultiset, frozenset):
+    if c is None:
+        continue
+
+    @case('multiset', c.__name__)
+    def hash_fresh(n, c=c):
+        # the frozen multisets cache their hash, so each run hashes a copy
+        data = elements(n)
+        return partial(c, data), hash
+
+for c in (orderable_multiset, orderable_frozenmultiset, nestable_orderable_frozenmultiset, tuple):
+    @case('ordering', c.__name__)
+    def compare(n, c=c):
+        # Dershowitz-Manna comparison of two multisets differing in few elements
+        a, b = c(elements(n)), c(elements(n)[:-3])
+        if c is tuple:
+            a, b = tuple(sorted(a, reverse=True)), tuple(sorted(b, reverse=True))
+        return partial(a.__lt__, b)
+
+    @case('ordering', c.__name__)
+    def sort(n, c=c):
+        # n / 10 multisets of 10 elements each
+        rnd = random.Random(3)
+        items = [[rnd.randrange(20) for _ in range(10)] for _ in range(max(n // 10, 1))]
+        if c is tuple:
+            return lambda: sorted(tuple(sorted(i, reverse=True)) for i in items)
+        return lambda: sorted(c(i) for i in items)
+
+@case('ordering', 'orderable_frozenmultiset')
+def sort_with_key(n):
+    rnd = random.Random(3)
+    items = [[rnd.randrange(20) for _ in range(10)] for _ in range(max(n // 10, 1))]
+    return lambda: sorted((orderable_frozenmultiset(i) for i in items), key=sort_key)
+
+# puredict and its baseline dict
+
+def mapping(n):
+    return dict((str(i), i) for i in range(n))
+
+def trie(n):
+    # a puredict whose trie is built, as opposed to a flat snapshot
+    return puredict.puredict(mapping(n)).insert('x', 0)
+
+for subject in ('puredict', 'dict'):
+    pure = subject == 'puredict'
+
+    @case('puredict', subject)
+    def construct(n, pure=pure):
+        return partial(puredict.puredict if pure else dict, mapping(n))
+
+    @case('puredict', subject)
+    def insert_each(n, pure=pure):
+        items = list(mapping(n).items())
+        if pure:
+            def run():
+                d = puredict.empty()
+                for k, v in items:
+                    d = d.insert(k, v)
+                return d
+        else:
+            def run():
+                d = {}
+                for k, v in items:
+                    d[k] = v
+                return d
+        return run
+
+    @case('puredict', subject)
+    def lookup(n, pure=pure):
+        d, keys = trie(n) if pure else mapping(n), [str(x) for x in probes(n)]
+        get = d.get
+        return lambda: [get(k) for k in keys]
+
+    @case('puredict', subject)
+    def iterate(n, pure=pure):
+        d = trie(n) if pure else mapping(n)
+        return lambda: list(d.items())
+
+    @case('puredict', subject)
+    def update_batch(n, pure=pure):
+        # a diff of n / 100 keys
+        d, changes = trie(n) if pure else mapping(n), dict((str(i), -i) for i in range(0, n, 100))
+        if pure:
+            return partial(d.update, changes)
+        def run():
+            copy = dict(d)
+            copy.update(changes)
+            return copy
+        return run
+
+    @case('puredict', subject)
+    def hash_fresh(n, pure=pure):
+        if pure:
+            return partial(trie, n), hash
+        return partial(mapping, n), lambda d: hash(frozenset(d.items()))
+
+    @case('puredict', subject)
+    def pickle_roundtrip(n, pure=pure):
+        d = trie(n) if pure else mapping(n)
+        return lambda: pickle.loads(pickle.dumps(d, pickle.HIGHEST_PROTOCOL))
+
+    @case('puredict', subject, memory=True)
+    def memory(n, pure=pure):
+        items = mapping(n)
+        if pure:
+            return bytes_per_element(lambda: puredict.empty().update(items), n)
+        return bytes_per_element(partial(dict, items), n)
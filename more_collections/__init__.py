@@ -1,3 +1,5 @@
 VERSION="0.3.0"
 from . import puredict as frozendict
 from .multisets import multiset, frozenmultiset, orderable_multiset, orderable_frozenmultiset, nestable_orderable_frozenmultiset
+from .concurrent_multisets import concurrent_multiset
+from .sketches import approximate_multiset
@@ -0,0 +1,253 @@
+try: # Python compat < 3.3
+    from collections.abc import MutableSet, Iterable, Mapping
+except ImportError:
+    from collections import MutableSet, Iterable, Mapping
+from contextlib import contextmanager
+from itertools import repeat
+from operator import mod
+from threading import Lock
+try: # Python compat < 3.4
+    from functools import partialmethod
+except ImportError:
+    from .common import partialmethod
+from .multisets import _base_multiset, frozenmultiset, _count, _count_elements, _checked_counts, \
+    _add_counts, _sub_counts, _or_counts, _and_counts, _xor_counts
+
+# A multiset that many threads can update at once. The element ->
+# multiplicity dict is split into shards by element hash, each guarded by its
+# own lock, so threads counting different elements rarely wait for each other.
+# Everything that reads more than one element works on a snapshot().
+
+def _counts_of(items):
+    if isinstance(items, concurrent_multiset):
+        return dict(items.snapshot().items())
+    if isinstance(items, _base_multiset):
+        return dict(items.items())
+    if isinstance(items, Iterable):
+        return _count(items)
+    raise NotImplementedError()
+
+def _update_counts(items):
+    # update() and subtract() take multiplicities from mappings
+    return _checked_counts(items) if isinstance(items, Mapping) else _counts_of(items)
+
+def _frozen(other):
+    return other.snapshot() if isinstance(other, concurrent_multiset) else other
+
+class concurrent_multiset(MutableSet):
+    __slots__ = ('__shards', '__locks', '__sizes')
+
+    def __init__(self, items=None, shards=16):
+        self.__shards = [{} for _ in range(shards)]
+        self.__locks = [Lock() for _ in range(shards)]
+        # total multiplicity per shard, so len() needs no lock
+        self.__sizes = [0] * shards
+        if isinstance(items, Iterable):
+            self.update(_counts_of(items))
+
+    @classmethod
+    def from_counts(cls, counts, shards=16):
+        # builds a multiset from a mapping of element -> multiplicity
+        result = cls(shards=shards)
+        result.update(_checked_counts(counts))
+        return result
+
+    def __shard(self, item):
+        return hash(item) % len(self.__shards)
+
+    def __grouped(self, counts):
+        # (shard index, element -> multiplicity) of the non-empty shards
+        n = len(self.__shards)
+        groups = [{} for _ in range(n)]
+        for (element, amount), h in zip(counts.items(), map(hash, counts)):
+            groups[h % n][element] = amount
+        return ((i, group) for (i, group) in enumerate(groups) if group)
+
+    def __grouped_elements(self, items):
+        # (shard index, elements) of the non-empty shards, split in C by a
+        # stable sort of the elements by shard
+        n = len(self.__shards)
+        shards = list(map(mod, map(hash, items), repeat(n)))
+        items = list(map(items.__getitem__, sorted(range(len(items)), key=shards.__getitem__)))
+        start = 0
+        for i, size in sorted(_count(shards).items()):
+            yield i, items[start:start + size]
+            start += size
+
+    def add(self, item, n=1):
+        if n < 0:
+            raise ValueError("multiplicities must not be negative")
+        if n:
+            i = self.__shard(item)
+            with self.__locks[i]:
+                bag = self.__shards[i]
+                bag[item] = bag.get(item, 0) + n
+                self.__sizes[i] += n
+
+    def discard(self, item, n=1):
+        # removes up to n copies of item
+        if n < 0:
+            raise ValueError("multiplicities must not be negative")
+        i = self.__shard(item)
+        with self.__locks[i]:
+            bag = self.__shards[i]
+            have = bag.get(item, 0)
+            if have > n:
+                bag[item] = have - n
+                self.__sizes[i] -= n
+            elif have:
+                del bag[item]
+                self.__sizes[i] -= have
+
+    def __take(self, i, item):
+        # removes one copy of item from shard i; its lock must be held
+        bag = self.__shards[i]
+        if bag[item] > 1:
+            bag[item] -= 1
+        else:
+            del bag[item]
+        self.__sizes[i] -= 1
+
+    def remove(self, item):
+        # removes one copy of item, KeyError if there is none
+        i = self.__shard(item)
+        with self.__locks[i]:
+            if item not in self.__shards[i]:
+                raise KeyError(item)
+            self.__take(i, item)
+
+    def pop(self):
+        # removes and returns an arbitrary element
+        for i, lock in enumerate(self.__locks):
+            with lock:
+                bag = self.__shards[i]
+                if bag:
+                    item = next(iter(bag))
+                    self.__take(i, item)
+                    return item
+        raise KeyError('pop from an empty multiset')
+
+    def clear(self):
+        with self.__all_locked() as shards:
+            for shard in shards:
+                shard.clear()
+            self.__sizes = [0] * len(shards)
+
+    def update(self, items):
+        # adds the elements of an iterable or a multiset, or the
+        # multiplicities of an element -> multiplicity mapping. Every shard is
+        # locked only once and plain elements are counted into it in C.
+        if isinstance(items, Iterable) and not isinstance(items,
+                (Mapping, _base_multiset, concurrent_multiset)):
+            for i, group in self.__grouped_elements(list(items)):
+                with self.__locks[i]:
+                    _count_elements(self.__shards[i], group)
+                    self.__sizes[i] += len(group)
+            return
+        for i, group in self.__grouped(_update_counts(items)):
+            with self.__locks[i]:
+                _add_counts(self.__shards[i], group)
+                self.__sizes[i] += sum(group.values())
+
+    def subtract(self, items):
+        # removes the elements of an iterable or a multiset, or the
+        # multiplicities of an element -> multiplicity mapping
+        for i, group in self.__grouped(_update_counts(items)):
+            with self.__locks[i]:
+                bag = self.__shards[i]
+                get = bag.get
+                self.__sizes[i] -= sum(min(get(e, 0), n) for (e, n) in group.items())
+                _sub_counts(bag, group)
+
+    @contextmanager
+    def __all_locked(self):
+        # always in the same order, so that two of these can't deadlock
+        for lock in self.__locks:
+            lock.acquire()
+        try:
+            yield self.__shards
+        finally:
+            for lock in self.__locks:
+                lock.release()
+
+    def snapshot(self):
+        # a frozenmultiset of the contents at one point in time
+        bag = {}
+        with self.__all_locked() as shards:
+            for shard in shards:
+                bag.update(shard)
+        return frozenmultiset._base_multiset__from_bag(bag)
+
+    def count(self, item):
+        i = self.__shard(item)
+        with self.__locks[i]:
+            return self.__shards[i].get(item, 0)
+
+    def __contains__(self, item):
+        return self.count(item) > 0
+
+    def __len__(self):
+        return sum(self.__sizes)
+
+    def __iter__(self):
+        return iter(self.snapshot())
+
+    items = lambda self: self.snapshot().items()
+    distinct = lambda self: self.snapshot().distinct()
+    counts = lambda self: self.snapshot().counts()
+    most_common = lambda self, k=None: self.snapshot().most_common(k)
+
+    __eq__ = lambda self, other: self.snapshot() == _frozen(other)
+    __ne__ = lambda self, other: not self == other
+    __le__ = lambda self, other: self.snapshot() <= _frozen(other)
+    __lt__ = lambda self, other: self.snapshot() < _frozen(other)
+    __ge__ = lambda self, other: self.snapshot() >= _frozen(other)
+    __gt__ = lambda self, other: self.snapshot() > _frozen(other)
+    __hash__ = None
+
+    def __combine(self, merge, other):
+        return self.from_counts(merge(dict(self.items()), _counts_of(other)),
+            len(self.__shards))
+
+    __sub__ = partialmethod(__combine, _sub_counts)
+    __add__ = partialmethod(__combine, _add_counts)
+    __or__ = partialmethod(__combine, _or_counts)
+    __and__ = partialmethod(__combine, _and_counts)
+    __xor__ = partialmethod(__combine, _xor_counts)
+
+    def __inplace(self, merge, other):
+        # the operations other than + and - need all elements at once
+        counts = _counts_of(other)
+        with self.__all_locked() as shards:
+            bag = {}
+            for shard in shards:
+                bag.update(shard)
+                shard.clear()
+            sizes = [0] * len(shards)
+            for element, amount in merge(bag, counts).items():
+                i = self.__shard(element)
+                shards[i][element] = amount
+                sizes[i] += amount
+            self.__sizes = sizes
+        return self
+
+    def __iadd__(self, other):
+        self.update(_counts_of(other))
+        return self
+
+    def __isub__(self, other):
+        self.subtract(_counts_of(other))
+        return self
+
+    __ior__ = partialmethod(__inplace, _or_counts)
+    __iand__ = partialmethod(__inplace, _and_counts)
+    __ixor__ = partialmethod(__inplace, _xor_counts)
+
+    def __repr__(self):
+        return '%s(%r)' % (self.__class__.__name__, list(self))
+
+    def __reduce__(self):
+        return (_restore, (self.__class__, dict(self.items()), len(self.__shards)))
+
+def _restore(cls, counts, shards):
+    return cls.from_counts(counts, shards)
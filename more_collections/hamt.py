@@ -0,0 +1,438 @@
+# Persistent hash array mapped trie (HAMT) used as the storage engine of
+# puredict. Nodes are never modified after construction; every update copies
+# only the path from the root to the changed entry and shares everything else
+# with the previous version.
+# https://en.wikipedia.org/wiki/Hash_array_mapped_trie
+
+from bisect import bisect_left
+from itertools import chain
+
+_BITS = 5
+_SLOT_MASK = (1 << _BITS) - 1
+# Slots are taken from the most significant bits of a 60 bit hash, so the
+# order of the leaves in the trie is the numeric order of their hashes. The
+# hash is mixed with a multiplication by the golden ratio first, because
+# python hashes of small ints carry all their entropy in the low bits.
+_MASK64 = (1 << 64) - 1
+_MIX = 0x9E3779B97F4A7C15
+_DROP = 4
+_ROOT_SHIFT = 64 - _DROP - _BITS
+
+# marks a slot of a bitmap node whose value is a child node instead of a value
+_NODE = object()
+
+# returned as the previous value by assoc and without for absent keys
+MISSING = object()
+
+
+def _hash(key):
+    return ((hash(key) * _MIX) & _MASK64) >> _DROP
+
+
+def _popcount(x):
+    return bin(x).count('1')
+
+
+class bitmap_node(object):
+    # array holds 2 entries per occupied slot: (key, value) for a leaf or
+    # (_NODE, child) for a subtree, ordered by slot
+    __slots__ = ('bitmap', 'array')
+
+    def __init__(self, bitmap, array):
+        self.bitmap = bitmap
+        self.array = array
+
+    def find(self, shift, h, key, default):
+        bit = 1 << ((h >> shift) & _SLOT_MASK)
+        if not self.bitmap & bit:
+            return default
+        idx = 2 * _popcount(self.bitmap & (bit - 1))
+        k, v = self.array[idx], self.array[idx + 1]
+        if k is _NODE:
+            return v.find(shift - _BITS, h, key, default)
+        if k is key or k == key:
+            return v
+        return default
+
+    def assoc(self, shift, h, key, value):
+        # returns the new node and the value previously stored for key
+        bit = 1 << ((h >> shift) & _SLOT_MASK)
+        idx = 2 * _popcount(self.bitmap & (bit - 1))
+        array = self.array
+        if not self.bitmap & bit:
+            return bitmap_node(self.bitmap | bit,
+                array[:idx] + (key, value) + array[idx:]), MISSING
+        k, v = array[idx], array[idx + 1]
+        if k is _NODE:
+            child, old = v.assoc(shift - _BITS, h, key, value)
+            if child is v:
+                return self, old
+            return bitmap_node(self.bitmap,
+                array[:idx] + (_NODE, child) + array[idx + 2:]), old
+        if k is key or k == key:
+            if v is value:
+                return self, v
+            return bitmap_node(self.bitmap,
+                array[:idx] + (key, value) + array[idx + 2:]), v
+        child = _pair(shift - _BITS, _hash(k), k, v, h, key, value)
+        return bitmap_node(self.bitmap,
+            array[:idx] + (_NODE, child) + array[idx + 2:]), MISSING
+
+    def without(self, shift, h, key):
+        # returns the new node, None if it became empty, and the removed value
+        bit = 1 << ((h >> shift) & _SLOT_MASK)
+        if not self.bitmap & bit:
+            return self, MISSING
+        idx = 2 * _popcount(self.bitmap & (bit - 1))
+        array = self.array
+        k, v = array[idx], array[idx + 1]
+        if k is _NODE:
+            child, old = v.without(shift - _BITS, h, key)
+            if child is v:
+                return self, old
+            if child is not None:
+                entry = child.collapsed() or (_NODE, child)
+                return bitmap_node(self.bitmap,
+                    array[:idx] + entry + array[idx + 2:]), old
+            v = old
+        elif not (k is key or k == key):
+            return self, MISSING
+        if self.bitmap == bit:
+            return None, v
+        return bitmap_node(self.bitmap ^ bit, array[:idx] + array[idx + 2:]), v
+
+    def assoc_many(self, shift, hashes, items, lo, hi, replaced):
+        # merges the hash sorted items[lo:hi] in one pass, copying every
+        # touched node once; (key, old value) of overwritten keys are
+        # appended to replaced
+        bitmap, array = self.bitmap, self.array
+        new, i = [], 0
+        while lo < hi:
+            h = hashes[lo]
+            prefix = h >> shift
+            end = bisect_left(hashes, (prefix + 1) << shift, lo + 1, hi)
+            bit = 1 << (prefix & _SLOT_MASK)
+            idx = 2 * _popcount(self.bitmap & (bit - 1))
+            new.extend(array[i:idx])
+            if not self.bitmap & bit:
+                new.extend(_entry(shift - _BITS, hashes, items, lo, end))
+                i = idx
+            else:
+                k, v = array[idx], array[idx + 1]
+                if k is _NODE:
+                    new.extend((_NODE, v.assoc_many(shift - _BITS,
+                        hashes, items, lo, end, replaced)))
+                else:
+                    hk = _hash(k)
+                    j = bisect_left(hashes, hk, lo, end)
+                    while j < end and hashes[j] == hk and not (
+                            items[j][0] is k or items[j][0] == k):
+                        j += 1
+                    if j < end and hashes[j] == hk:
+                        replaced.append((k, v))
+                        new.extend(_entry(shift - _BITS, hashes, items, lo, end))
+                    else:
+                        new.extend(_entry(shift - _BITS,
+                            hashes[lo:j] + [hk] + hashes[j:end],
+                            items[lo:j] + [(k, v)] + items[j:end],
+                            0, end - lo + 1))
+                i = idx + 2
+            bitmap |= bit
+            lo = end
+        new.extend(array[i:])
+        return bitmap_node(bitmap, tuple(new))
+
+    def without_many(self, shift, hashes, keys, lo, hi, removed):
+        # removes the hash sorted keys[lo:hi] in one pass; returns None if
+        # the node becomes empty and appends (key, value) of removed keys
+        bitmap, array = self.bitmap, self.array
+        new, i, changed = [], 0, False
+        while lo < hi:
+            prefix = hashes[lo] >> shift
+            start, lo = lo, bisect_left(hashes, (prefix + 1) << shift, lo + 1, hi)
+            bit = 1 << (prefix & _SLOT_MASK)
+            if not self.bitmap & bit:
+                continue
+            idx = 2 * _popcount(self.bitmap & (bit - 1))
+            new.extend(array[i:idx])
+            i = idx + 2
+            k, v = array[idx], array[idx + 1]
+            if k is _NODE:
+                child = v.without_many(shift - _BITS,
+                    hashes, keys, start, lo, removed)
+                if child is v:
+                    new.extend((k, v))
+                    continue
+                if child is not None:
+                    new.extend(child.collapsed() or (_NODE, child))
+                else:
+                    bitmap ^= bit
+            elif any(g is k or g == k for g in keys[start:lo]):
+                removed.append((k, v))
+                bitmap ^= bit
+            else:
+                new.extend((k, v))
+                continue
+            changed = True
+        if not changed:
+            return self
+        new.extend(array[i:])
+        return bitmap_node(bitmap, tuple(new)) if bitmap else None
+
+    def collapsed(self):
+        # the entry the parent can hold in place of this node if it has only
+        # one leaf or collision node left, which keeps the trie canonical
+        if len(self.array) == 2 and (self.array[0] is not _NODE or
+                isinstance(self.array[1], collision_node)):
+            return self.array
+        return None
+
+    def depth(self):
+        array = self.array
+        return 1 + max([array[i + 1].depth()
+            for i in range(0, len(array), 2) if array[i] is _NODE] or [0])
+
+    def items(self):
+        array = self.array
+        for i in range(0, len(array), 2):
+            k = array[i]
+            if k is _NODE:
+                for item in array[i + 1].items():
+                    yield item
+            else:
+                yield k, array[i + 1]
+
+
+class collision_node(object):
+    # keys whose full hashes are equal, stored as a flat (key, value) array
+    __slots__ = ('hash', 'array')
+
+    def __init__(self, hash, array):
+        self.hash = hash
+        self.array = array
+
+    def _index(self, key):
+        array = self.array
+        for i in range(0, len(array), 2):
+            k = array[i]
+            if k is key or k == key:
+                return i
+        return -1
+
+    def find(self, shift, h, key, default):
+        if h != self.hash:
+            return default
+        idx = self._index(key)
+        return default if idx < 0 else self.array[idx + 1]
+
+    def assoc(self, shift, h, key, value):
+        if h != self.hash:
+            # move this node one level down next to the new leaf
+            node = bitmap_node(1 << ((self.hash >> shift) & _SLOT_MASK),
+                (_NODE, self))
+            return node.assoc(shift, h, key, value)
+        idx = self._index(key)
+        array = self.array
+        if idx < 0:
+            return collision_node(h, array + (key, value)), MISSING
+        old = array[idx + 1]
+        if old is value:
+            return self, old
+        return collision_node(h,
+            array[:idx] + (key, value) + array[idx + 2:]), old
+
+    def without(self, shift, h, key):
+        if h != self.hash:
+            return self, MISSING
+        idx = self._index(key)
+        if idx < 0:
+            return self, MISSING
+        old = self.array[idx + 1]
+        if len(self.array) == 2:
+            return None, old
+        return collision_node(h,
+            self.array[:idx] + self.array[idx + 2:]), old
+
+    def assoc_many(self, shift, hashes, items, lo, hi, replaced):
+        node = self
+        for i in range(lo, hi):
+            key, value = items[i]
+            node, old = node.assoc(shift, hashes[i], key, value)
+            if old is not MISSING:
+                replaced.append((key, old))
+        return node
+
+    def without_many(self, shift, hashes, keys, lo, hi, removed):
+        node = self
+        for i in range(lo, hi):
+            node, old = node.without(shift, hashes[i], keys[i])
+            if old is not MISSING:
+                removed.append((keys[i], old))
+            if node is None:
+                break
+        return node
+
+    def collapsed(self):
+        if len(self.array) == 2:
+            return self.array
+        return None
+
+    def depth(self):
+        return 1
+
+    def items(self):
+        array = self.array
+        for i in range(0, len(array), 2):
+            yield array[i], array[i + 1]
+
+
+def _pair(shift, h1, k1, v1, h2, k2, v2):
+    # smallest subtree holding two distinct keys
+    if h1 == h2:
+        return collision_node(h1, (k1, v1, k2, v2))
+    s1, s2 = (h1 >> shift) & _SLOT_MASK, (h2 >> shift) & _SLOT_MASK
+    if s1 == s2:
+        return bitmap_node(1 << s1,
+            (_NODE, _pair(shift - _BITS, h1, k1, v1, h2, k2, v2)))
+    if s1 > s2:
+        k1, v1, k2, v2, s1, s2 = k2, v2, k1, v1, s2, s1
+    return bitmap_node((1 << s1) | (1 << s2), (k1, v1, k2, v2))
+
+
+def _entry(shift, hashes, items, lo, hi):
+    # the slot entry for the hash sorted items[lo:hi] that share a slot in the
+    # level above shift: a leaf, a collision node or a new subtree
+    if hi - lo == 1:
+        return items[lo]
+    h = hashes[lo]
+    if hashes[hi - 1] == h:
+        return _NODE, collision_node(h, tuple(chain.from_iterable(items[lo:hi])))
+    return _NODE, _build(shift, hashes, items, lo, hi)
+
+
+def _build(shift, hashes, items, lo, hi):
+    # builds the subtree for items[lo:hi] bottom-up. The items are sorted by
+    # hash, which is also their order in the trie, so each slot is a
+    # contiguous run that bisect finds at C speed. The result is the same
+    # canonical trie that inserting the items one by one produces.
+    bitmap = 0
+    array = []
+    while lo < hi:
+        prefix = hashes[lo] >> shift
+        end = bisect_left(hashes, (prefix + 1) << shift, lo + 1, hi)
+        bitmap |= 1 << (prefix & _SLOT_MASK)
+        array.extend(_entry(shift - _BITS, hashes, items, lo, end))
+        lo = end
+    return bitmap_node(bitmap, tuple(array))
+
+
+def _sorted_by_hash(keys, entries):
+    hashes = [((h * _MIX) & _MASK64) >> _DROP for h in map(hash, keys)]
+    order = sorted(range(len(hashes)), key=hashes.__getitem__)
+    return [hashes[i] for i in order], [entries[i] for i in order]
+
+
+def diff_mappings(a, b):
+    # (key, value in a, value in b) of the keys whose values differ between
+    # two mappings, with MISSING for absent keys
+    for k, v in a.items():
+        w = b.get(k, MISSING)
+        if not (v is w or (w is not MISSING and v == w)):
+            yield k, v, w
+    for k, w in b.items():
+        if k not in a:
+            yield k, MISSING, w
+
+
+def _subtree_items(k, v):
+    return v.items() if k is _NODE else ((k, v),)
+
+
+def diff(a, b):
+    # (key, value in a, value in b) of all keys whose values differ between
+    # the tries with roots a and b, with MISSING for absent keys. Bitmap
+    # nodes of the same level are compared slot by slot.
+    # Subtrees both share are skipped, so the cost grows with the number of
+    # differing entries rather than the size of the tries.
+    if a is b:
+        return
+    bits, bitmap_a, bitmap_b = a.bitmap | b.bitmap, a.bitmap, b.bitmap
+    array_a, array_b = a.array, b.array
+    i = j = 0
+    while bits:
+        # the arrays are ordered by slot, so both are walked in step
+        bit = bits & -bits
+        bits ^= bit
+        ka = kb = MISSING
+        if bitmap_a & bit:
+            ka, va = array_a[i], array_a[i + 1]
+            i += 2
+        if bitmap_b & bit:
+            kb, vb = array_b[j], array_b[j + 1]
+            j += 2
+        if ka is MISSING:
+            for k, v in _subtree_items(kb, vb):
+                yield k, MISSING, v
+        elif kb is MISSING:
+            for k, v in _subtree_items(ka, va):
+                yield k, v, MISSING
+        elif ka is _NODE and kb is _NODE and va is vb:
+            continue
+        elif ka is _NODE and kb is _NODE and \
+                isinstance(va, bitmap_node) and isinstance(vb, bitmap_node):
+            for d in diff(va, vb):
+                yield d
+        elif ka is not _NODE and kb is not _NODE and (ka is kb or ka == kb):
+            if not (va is vb or va == vb):
+                yield ka, va, vb
+        else:
+            # a leaf against a subtree or a collision node: few items
+            for d in diff_mappings(dict(_subtree_items(ka, va)), dict(_subtree_items(kb, vb))):
+                yield d
+
+
+def from_dict(d):
+    # builds a trie from the items of a dict (or any mapping with unique keys)
+    if not d:
+        return EMPTY
+    hashes, items = _sorted_by_hash(d, list(d.items()))
+    return _build(_ROOT_SHIFT, hashes, items, 0, len(items))
+
+
+EMPTY = bitmap_node(0, ())
+
+
+def find(root, key, default=None):
+    return root.find(_ROOT_SHIFT, _hash(key), key, default)
+
+
+def assoc(root, key, value):
+    # returns the new root and the previous value of key (or MISSING)
+    return root.assoc(_ROOT_SHIFT, _hash(key), key, value)
+
+
+def without(root, key):
+    # returns the new root and the removed value of key (or MISSING)
+    node, old = root.without(_ROOT_SHIFT, _hash(key), key)
+    return (EMPTY if node is None else node), old
+
+
+def assoc_many(root, d):
+    # returns the new root and a list of (key, old value) for the keys of the
+    # dict d that were already present
+    replaced = []
+    if not d:
+        return root, replaced
+    hashes, items = _sorted_by_hash(d, list(d.items()))
+    return root.assoc_many(_ROOT_SHIFT, hashes, items, 0, len(items), replaced), replaced
+
+
+def without_many(root, keys):
+    # returns the new root and a list of the removed (key, value) items for
+    # a sequence of distinct keys
+    removed = []
+    if not keys:
+        return root, removed
+    hashes, keys = _sorted_by_hash(keys, keys)
+    node = root.without_many(_ROOT_SHIFT, hashes, keys, 0, len(keys), removed)
+    return (EMPTY if node is None else node), removed
@@ -0,0 +1,210 @@
+try: # Python compat < 3.3
+    from collections.abc import Set, MutableSet, Hashable, Iterable, Mapping
+except ImportError:
+    from collections import Set, MutableSet, Hashable, Iterable, Mapping
+import operator
+from itertools import chain, repeat, starmap
+try: # Python compat < 3.3
+    from types import MappingProxyType
+except ImportError:
+    MappingProxyType = dict
+import numpy
+try: # Python compat < 3.4
+    from functools import partialmethod
+except ImportError:
+    from .common import partialmethod
+
+# Multisets over small non-negative integers (token ids, feature ids, ...)
+# that keep their multiplicities in a dense numpy array indexed by element,
+# so construction, the set algebra and the comparisons are vectorized.
+
+_dtype = numpy.int64
+
+def _counts_of(items):
+    if isinstance(items, _base_int_multiset):
+        return items._counts.copy()
+    if isinstance(items, numpy.ndarray):
+        # the same elements as add() takes, without rounding floats or
+        # parsing strings; empty arrays default to float and are fine
+        if items.size and not (numpy.issubdtype(items.dtype, numpy.integer)
+                or items.dtype == numpy.bool_):
+            raise TypeError("elements of int multisets must be integers, not %s" % items.dtype)
+        items = items.ravel().astype(_dtype, copy=False)
+    elif isinstance(items, Iterable):
+        items = numpy.fromiter(map(operator.index, items), dtype=_dtype)
+    else:
+        return numpy.zeros(0, dtype=_dtype)
+    if len(items) and items.min() < 0:
+        raise ValueError("elements of int multisets must be non-negative")
+    return numpy.bincount(items).astype(_dtype, copy=False)
+
+def _aligned(a, b):
+    if len(a) < len(b):
+        a = numpy.concatenate((a, numpy.zeros(len(b) - len(a), dtype=_dtype)))
+    elif len(b) < len(a):
+        b = numpy.concatenate((b, numpy.zeros(len(a) - len(b), dtype=_dtype)))
+    return a, b
+
+def _trimmed(counts):
+    nonzero = numpy.flatnonzero(counts)
+    return counts[:nonzero[-1] + 1] if len(nonzero) else counts[:0]
+
+def _absdiff(a, b):
+    return numpy.abs(a - b)
+
+def _monus(a, b):
+    return numpy.maximum(a - b, 0)
+
+class _base_int_multiset(Set):
+    __slots__ = ('_counts',)
+
+    def __init__(self, items=None):
+        self._counts = _counts_of(items)
+
+    @classmethod
+    def _from_counts(cls, counts):
+        ms = cls()
+        ms._counts = counts
+        return ms
+
+    @classmethod
+    def from_counts(cls, counts):
+        # builds a multiset from a mapping of element -> multiplicity
+        elements = numpy.fromiter(map(operator.index, counts.keys()), dtype=_dtype)
+        amounts = numpy.fromiter(map(operator.index, counts.values()), dtype=_dtype)
+        if len(elements) and elements.min() < 0:
+            raise ValueError("elements of int multisets must be non-negative")
+        if len(amounts) and amounts.min() < 0:
+            raise ValueError("multiplicities must not be negative")
+        result = numpy.zeros(elements.max() + 1 if len(elements) else 0, dtype=_dtype)
+        result[elements] = amounts
+        return cls._from_counts(result)
+
+    def __contains__(self, item):
+        return self.count(item) > 0
+
+    def __len__(self):
+        return int(self._counts.sum())
+
+    def __iter__(self):
+        return chain.from_iterable(starmap(repeat, self.items()))
+
+    def __le__(self, other):
+        if not isinstance(other, _base_int_multiset):
+            raise NotImplementedError()
+        a, b = _aligned(self._counts, other._counts)
+        return bool((a <= b).all())
+
+    def __eq__(self, other):
+        if not isinstance(other, _base_int_multiset):
+            raise NotImplementedError()
+        a, b = _aligned(self._counts, other._counts)
+        return bool((a == b).all())
+
+    def __lt__(self, other):
+        return (self <= other) and not (self == other)
+
+    def __gt__(self, other):
+        if not isinstance(other, _base_int_multiset):
+            raise NotImplementedError()
+        return other < self
+
+    def __ge__(self, other):
+        if not isinstance(other, _base_int_multiset):
+            raise NotImplementedError()
+        return other <= self
+
+    def __combine(self, amnt_op, other):
+        if not isinstance(other, _base_int_multiset):
+            if not isinstance(other, Iterable):
+                raise NotImplementedError()
+            other = self._from_counts(_counts_of(other))
+        return self._from_counts(amnt_op(*_aligned(self._counts, other._counts)))
+
+    __sub__ = partialmethod(__combine, _monus)
+    __add__ = partialmethod(__combine, operator.add)
+    __or__ = partialmethod(__combine, numpy.maximum)
+    __and__ = partialmethod(__combine, numpy.minimum)
+    __xor__ = partialmethod(__combine, _absdiff)
+
+    def count(self, item):
+        try:
+            i = operator.index(item)
+        except TypeError:
+            return 0
+        counts = self._counts
+        return int(counts[i]) if 0 <= i < len(counts) else 0
+
+    def items(self):
+        elements = numpy.flatnonzero(self._counts)
+        return zip(elements.tolist(), self._counts[elements].tolist())
+
+    def distinct(self):
+        return numpy.flatnonzero(self._counts).tolist()
+
+    def counts(self):
+        return MappingProxyType(dict(self.items()))
+
+    def most_common(self, k=None):
+        counts = self._counts
+        elements = numpy.flatnonzero(counts)
+        if k is not None and k < len(elements):
+            # partial selection of the k largest, then sort only those
+            elements = elements[numpy.argpartition(-counts[elements], k)[:k]] if k > 0 else elements[:0]
+        elements = elements[numpy.argsort(-counts[elements], kind='stable')]
+        return list(zip(elements.tolist(), counts[elements].tolist()))
+
+    def __reduce__(self):
+        # the trimmed counts, so that equal multisets pickle the same
+        return (self._from_counts, (_trimmed(self._counts).copy(),))
+
+class int_multiset(_base_int_multiset, MutableSet):
+    __slots__ = ()
+
+    def add(self, item, n=1):
+        if n < 0:
+            raise ValueError("multiplicities must not be negative")
+        i = operator.index(item)
+        if i < 0:
+            raise ValueError("elements of int multisets must be non-negative")
+        if i >= len(self._counts):
+            # grow geometrically so that adding ascending ids is amortized O(1)
+            grown = numpy.zeros(max(i + 1, 2 * len(self._counts)), dtype=_dtype)
+            grown[:len(self._counts)] = self._counts
+            self._counts = grown
+        self._counts[i] += n
+
+    def discard(self, item, n=1):
+        # removes up to n copies of item
+        if n < 0:
+            raise ValueError("multiplicities must not be negative")
+        have = self.count(item)
+        if have:
+            self._counts[operator.index(item)] -= min(have, n)
+
+    def update(self, items):
+        # adds the elements of an iterable or a multiset, or the
+        # multiplicities of an element -> multiplicity mapping
+        self += self.from_counts(items) if isinstance(items, Mapping) else items
+
+    def subtract(self, items):
+        # removes the elements of an iterable or a multiset, or the
+        # multiplicities of an element -> multiplicity mapping
+        self -= self.from_counts(items) if isinstance(items, Mapping) else items
+
+    def __inplace(self, amnt_op, other):
+        result = self._base_int_multiset__combine(amnt_op, other)
+        self._counts = result._counts
+        return self
+
+    __isub__ = partialmethod(__inplace, _monus)
+    __iadd__ = partialmethod(__inplace, operator.add)
+    __ior__ = partialmethod(__inplace, numpy.maximum)
+    __iand__ = partialmethod(__inplace, numpy.minimum)
+    __ixor__ = partialmethod(__inplace, _absdiff)
+
+class int_frozenmultiset(_base_int_multiset, Hashable):
+    __slots__ = ()
+
+    def __hash__(self):
+        return hash(_trimmed(self._counts).tobytes())
@@ -0,0 +1,241 @@
+# Compact binary file format for read-only snapshots of frozen multisets and
+# puredicts. The readers memory-map the file and look keys up in an on-disk
+# hash table, so processes that open the same file share one copy in the page
+# cache and nothing is parsed up front.
+#
+# Layout (little endian):
+#   header   magic, kind, number of entries, number of slots, total multiplicity
+#   slots    open addressing table of (crc32 of the key, offset of its record),
+#            offset 0 marks an empty slot; linear probing
+#   records  key length, multiplicity or value length, pickled key, pickled value
+#
+# Keys are found by their pickled bytes: lookups only find keys that pickle
+# exactly like the stored ones. Keys are pickled without the memo, so equal
+# but distinct objects inside a key don't change its bytes, and frozensets,
+# frozen multisets and puredicts are pickled with their parts sorted by their
+# own bytes instead of in hash or insertion order, which differ between
+# processes. Other keys must pickle the same when equal, like str, bytes, int
+# and tuples of them, but e.g. 1.0 doesn't find 1.
+import io
+import mmap
+import pickle
+import struct
+import zlib
+from itertools import chain, repeat, starmap
+try: # Python compat < 3.3
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+
+_MAGIC = b'MCMAP\x00\x01\x00'
+_HEADER = struct.Struct('<8sBQQQ')
+_SLOT = struct.Struct('<IQ')
+_RECORD = struct.Struct('<IQ')
+_COUNTS, _MAPPING = 1, 2
+# fixed, so that files are readable by every python that can unpickle them
+_KEY_PROTOCOL = 2
+
+def _key_bytes(key):
+    buf = io.BytesIO()
+    pickler = pickle.Pickler(buf, _KEY_PROTOCOL)
+    # the memo would make the bytes depend on which parts are the same object
+    pickler.fast = True
+    pickler.dump(_canonical(key))
+    return buf.getvalue()
+
+def _from_parts(make, parts):
+    return make(map(pickle.loads, parts))
+
+def _from_items(make, parts):
+    return make(dict(map(pickle.loads, parts)))
+
+class _sorted(object):
+    # pickles like an unordered collection, but with its parts sorted by
+    # their own bytes instead of in hash or insertion order
+    __slots__ = ('__reduced',)
+
+    def __init__(self, rebuild, make, parts):
+        self.__reduced = (rebuild, (make, tuple(sorted(map(_key_bytes, parts)))))
+
+    def __reduce__(self):
+        return self.__reduced
+
+# (class, key -> function that rebuilds it from a dict) of the frozen
+# multisets and puredicts, filled on first use as multisets and puredict
+# import this module
+_collections = []
+
+def _canonical(key):
+    # the key with its frozensets, frozen multisets and puredicts replaced by
+    # objects that pickle the same in every process
+    if type(key) is tuple:
+        return tuple(map(_canonical, key))
+    if isinstance(key, frozenset):
+        return _sorted(_from_parts, type(key), key)
+    if not _collections:
+        from .multisets import frozenmultiset
+        from .puredict import puredict_base, _from_dict
+        _collections.extend(((frozenmultiset, lambda ms: ms.from_counts),
+            (puredict_base, lambda d: _from_dict)))
+    for cls, make in _collections:
+        if isinstance(key, cls):
+            return _sorted(_from_items, make(key), key.items())
+    return key
+
+def _crc(data):
+    return zlib.crc32(data) & 0xffffffff
+
+def _slot_count(entries):
+    # a power of two with a load factor of at most 3/4
+    slots = 2
+    while slots * 3 < entries * 4:
+        slots *= 2
+    return slots
+
+def _write(path, kind, entries, items, total):
+    slots = _slot_count(entries)
+    table = bytearray(slots * _SLOT.size)
+    mask = slots - 1
+    offset = _HEADER.size + len(table)
+    with open(path, 'wb') as f:
+        f.seek(offset)
+        for key, value in items:
+            data = _key_bytes(key)
+            if kind == _MAPPING:
+                value = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+                f.write(_RECORD.pack(len(data), len(value)) + data + value)
+                size = _RECORD.size + len(data) + len(value)
+            else:
+                f.write(_RECORD.pack(len(data), value) + data)
+                size = _RECORD.size + len(data)
+            crc = _crc(data)
+            i = crc & mask
+            while _SLOT.unpack_from(table, i * _SLOT.size)[1]:
+                i = (i + 1) & mask
+            _SLOT.pack_into(table, i * _SLOT.size, crc, offset)
+            offset += size
+        f.seek(0)
+        f.write(_HEADER.pack(_MAGIC, kind, entries, slots, total))
+        f.write(table)
+
+def save_counts(path, counts):
+    # writes an element -> multiplicity mapping
+    _write(path, _COUNTS, len(counts), counts.items(), sum(counts.values()))
+
+def save_mapping(path, mapping):
+    _write(path, _MAPPING, len(mapping), mapping.items(), len(mapping))
+
+class _mapped(object):
+    __slots__ = ('_map', '_entries', '_slots', '_total')
+    _kind = None
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, kind = None, None
+        if len(self._map) >= _HEADER.size:
+            magic, kind, self._entries, self._slots, self._total = \
+                _HEADER.unpack_from(self._map, 0)
+        if magic != _MAGIC or kind != self._kind:
+            self._map.close()
+            raise ValueError("%s is not a %s file" % (path, self.__class__.__name__))
+
+    def _find(self, key):
+        # offset of the record of key, 0 if it is absent; unhashable keys
+        # raise like the lookups of the in-memory variants
+        hash(key)
+        try:
+            data = _key_bytes(key)
+        except (pickle.PicklingError, TypeError, AttributeError, ValueError):
+            return 0
+        m, crc, mask = self._map, _crc(data), self._slots - 1
+        i = crc & mask
+        while True:
+            h, offset = _SLOT.unpack_from(m, _HEADER.size + i * _SLOT.size)
+            if not offset:
+                return 0
+            if h == crc:
+                start = offset + _RECORD.size
+                if m[start:start + _RECORD.unpack_from(m, offset)[0]] == data:
+                    return offset
+            i = (i + 1) & mask
+
+    def _records(self):
+        # (offset of the key, key length, multiplicity or value length)
+        m = self._map
+        offset = _HEADER.size + self._slots * _SLOT.size
+        for _ in range(self._entries):
+            length, value = _RECORD.unpack_from(m, offset)
+            offset += _RECORD.size
+            yield offset, length, value
+            offset += length + (value if self._kind == _MAPPING else 0)
+
+    def _key(self, offset, length):
+        return pickle.loads(self._map[offset:offset + length])
+
+    def close(self):
+        self._map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class mapped_multiset(_mapped):
+    # read-only multiset view of a file written by frozenmultiset.save()
+    __slots__ = ('_cls',)
+    _kind = _COUNTS
+
+    def __init__(self, path, cls=None):
+        _mapped.__init__(self, path)
+        self._cls = cls
+
+    def count(self, item):
+        offset = self._find(item)
+        return _RECORD.unpack_from(self._map, offset)[1] if offset else 0
+
+    def __contains__(self, item):
+        return self._find(item) != 0
+
+    def __len__(self):
+        return self._total
+
+    def items(self):
+        return ((self._key(o, l), n) for (o, l, n) in self._records())
+
+    def distinct(self):
+        return (self._key(o, l) for (o, l, _) in self._records())
+
+    def __iter__(self):
+        return chain.from_iterable(starmap(repeat, self.items()))
+
+    def materialize(self):
+        # an in-memory multiset of the class open_mmap() was called on
+        return self._cls.from_counts(dict(self.items()))
+
+class mapped_dict(_mapped, Mapping):
+    # read-only mapping view of a file written by puredict's save()
+    __slots__ = ()
+    _kind = _MAPPING
+
+    def __getitem__(self, key):
+        offset = self._find(key)
+        if not offset:
+            raise KeyError(key)
+        length, value = _RECORD.unpack_from(self._map, offset)
+        start = offset + _RECORD.size + length
+        return pickle.loads(self._map[start:start + value])
+
+    def __contains__(self, key):
+        return self._find(key) != 0
+
+    def __len__(self):
+        return self._entries
+
+    def __iter__(self):
+        return (self._key(o, l) for (o, l, _) in self._records())
+
+    def items(self):
+        m = self._map
+        return ((self._key(o, l), pickle.loads(m[o + l:o + l + n])) for (o, l, n) in self._records())
@@ -1,47 +1,144 @@
 try: # Python compat < 3.3
-    from collections.abc import Set, MutableSet, Hashable, Iterable
+    from collections.abc import Set, MutableSet, Hashable, Iterable, Mapping
 except ImportError:
-    from collections import Set, MutableSet, Hashable, Iterable
+    from collections import Set, MutableSet, Hashable, Iterable, Mapping
 from collections import defaultdict
 from functools import reduce
-from itertools import chain
-import operator
+from itertools import chain, repeat, starmap, islice
+from operator import itemgetter
+from bisect import bisect_left
+import heapq
+from .mapped import save_counts, mapped_multiset
+try: # Python compat < 3.3
+    from types import MappingProxyType
+except ImportError:
+    MappingProxyType = dict
 try: # Python compat < 3.4
     from functools import partialmethod
 except ImportError:
     from .common import partialmethod
+try: # counting loop of collections.Counter, in C since Python 3.3
+    from collections import _count_elements
+except ImportError:
+    def _count_elements(counts, iterable):
+        get = counts.get
+        for i in iterable:
+            counts[i] = get(i, 0) + 1
+
+# frozen multisets with at most that many distinct elements use a tuple
+_COMPACT_LIMIT = 8
+
+# iterables whose len() is the number of elements they iterate
+_SIZED = (list, tuple, str, bytes, type(range(0)), set, frozenset)
+
+def _count(iterable):
+    counts = {}
+    _count_elements(counts, iterable)
+    return counts
+
+def _checked_counts(counts):
+    # element -> multiplicity mapping without zero multiplicities
+    result = {}
+    for element, amount in counts.items():
+        if amount < 0:
+            raise ValueError("multiplicities must not be negative")
+        if amount:
+            result[element] = amount
+    return result
+
+# The set algebra works on element -> multiplicity dicts: each function
+# merges counts into bag in a single pass over counts and returns the result.
+# All but _and_counts update bag in place.
+
+def _add_counts(bag, counts):
+    get = bag.get
+    for element, amount in counts.items():
+        bag[element] = get(element, 0) + amount
+    return bag
+
+def _sub_counts(bag, counts):
+    get = bag.get
+    for element, amount in counts.items():
+        have = get(element, 0)
+        if have > amount:
+            bag[element] = have - amount
+        elif have:
+            del bag[element]
+    return bag
+
+def _or_counts(bag, counts):
+    get = bag.get
+    for element, amount in counts.items():
+        if amount > get(element, 0):
+            bag[element] = amount
+    return bag
+
+def _and_counts(bag, counts):
+    # only walks the smaller side and leaves bag untouched
+    small, large = (counts, bag) if len(counts) < len(bag) else (bag, counts)
+    get = large.get
+    result = {}
+    for element, amount in small.items():
+        other = get(element, 0)
+        if other:
+            result[element] = amount if amount < other else other
+    return result
+
+def _xor_counts(bag, counts):
+    get = bag.get
+    for element, amount in counts.items():
+        diff = get(element, 0) - amount
+        if diff:
+            bag[element] = diff if diff > 0 else -diff
+        else:
+            del bag[element]
+    return bag
 
 class _base_multiset(Set):
+    # The element -> multiplicity dict __bag is a slot of multiset and a
+    # property of frozenmultiset, which stores small multisets more compactly.
+    __slots__ = ('__len',)
 
     def __init__(self, items=None):
-        self.__bag = {}
-        if isinstance(items, Iterable):
-            for i in items:
-                self.__bag[i] = self.__bag.get(i, 0) + 1
+        self.__bag = _count(items) if isinstance(items, Iterable) else {}
+        # total multiplicity, kept up to date by every mutation
+        self.__len = sum(self.__bag.values())
 
     def __contains__(self, item):
         return self.__bag.get(item, 0) > 0
 
     def __len__(self):
-        return sum(self.__bag.values())
+        return self.__len
 
     def __iter__(self):
-        for item in self.__bag:
-            for _ in range(self.__bag[item]):
-                yield item
+        return chain.from_iterable(starmap(repeat, self.items()))
 
     def __le__(self, other):
         if not isinstance(other, _base_multiset) or isinstance(other, _orderable_mixin):
             raise NotImplementedError()
-        return all((self.count(i) <= other.count(i)) for i in self.__bag)
+        a, b = self.__bag, other.__bag
+        if self.__len > other.__len or len(a) > len(b):
+            return False
+        get = b.get
+        return all(get(i, 0) >= amount for (i, amount) in a.items())
 
     def __eq__(self, other):
         if not isinstance(other, _base_multiset):
             raise NotImplementedError()
-        return all((self.count(i) == other.count(i)) for i in chain(self.__bag, other.__bag))
+        if self is other:
+            return True
+        if self.__len != other.__len:
+            return False
+        # frozen multisets may already know their hash
+        h1 = getattr(self, '_frozenmultiset__hash', None)
+        h2 = getattr(other, '_frozenmultiset__hash', None)
+        if h1 is not None and h2 is not None and h1 != h2:
+            return False
+        a, b = self.__bag, other.__bag
+        return len(a) == len(b) and a == b
 
     def __lt__(self, other):
-        return (self <= other) and not (self == other)
+        return (self <= other) and self.__len != other.__len
 
     def __gt__(self, other):
         if not isinstance(other, _base_multiset):
@@ -53,25 +150,77 @@ class _base_multiset(Set):
             raise NotImplementedError()
         return other <= self
 
-    def __combine(self, amnt_op, this_op, other):
+    def __counts(self, other):
+        # element -> multiplicity of the other operand; a plain dict for
+        # iterables instead of a whole multiset
         if isinstance(other, _base_multiset):
-            result = self.__class__()
-            for element in chain(self.__bag, other.__bag):
-                amount = amnt_op(self.count(element), other.count(element))
-                if amount > 0:
-                    result.__bag[element] = amount
-            return result
-
+            return other.__bag
         if isinstance(other, Iterable):
-            return this_op(self, self.__class__(other))
-
+            return _count(other)
         raise NotImplementedError()
 
-    __sub__ = partialmethod(__combine, operator.sub, operator.sub)
-    __add__ = partialmethod(__combine, operator.add, operator.add)
-    __or__ = partialmethod(__combine, max, operator.or_)
-    __and__ = partialmethod(__combine, min, operator.and_)
-    __xor__ = partialmethod(__combine, lambda l, r: abs(l - r), operator.xor)
+    def __combine(self, merge, copy, other):
+        result = self.__class__()
+        bag = dict(self.__bag) if copy else self.__bag
+        result.__bag = merge(bag, self.__counts(other))
+        result.__len = sum(result.__bag.values())
+        return result
+
+    __sub__ = partialmethod(__combine, _sub_counts, True)
+    __add__ = partialmethod(__combine, _add_counts, True)
+    __or__ = partialmethod(__combine, _or_counts, True)
+    __and__ = partialmethod(__combine, _and_counts, False)
+    __xor__ = partialmethod(__combine, _xor_counts, True)
+
+    @classmethod
+    def __from_bag(cls, bag):
+        result = cls()
+        result.__bag = bag
+        result.__len = sum(bag.values())
+        return result
+
+    @classmethod
+    def from_counts(cls, counts):
+        # builds a multiset from a mapping of element -> multiplicity
+        return cls.__from_bag(_checked_counts(counts))
+
+    @classmethod
+    def from_parallel(cls, items, reader=None, chunksize=1 << 16, executor=None):
+        # counts items in chunks of chunksize in a process pool (or the given
+        # concurrent.futures executor). With a reader, items are sources like
+        # file names and every worker counts reader(source) itself, so only
+        # the sources and the partial counts travel between processes.
+        # imported here, as they take longer to import than the rest of the module
+        try: # Python compat < 3.2
+            from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+        except ImportError:
+            raise ImportError("from_parallel needs concurrent.futures, "
+                "part of Python 3.2 and later or the futures backport")
+        from multiprocessing import cpu_count
+        if reader is None:
+            it = iter(items)
+            chunks = iter(lambda: list(islice(it, chunksize)), [])
+        else:
+            chunks = iter(items)
+        pool = ProcessPoolExecutor() if executor is None else executor
+        # a bounded number of chunks in flight keeps long streams out of memory
+        limit, pending, bag = 2 * cpu_count(), set(), {}
+        try:
+            for chunk in chunks:
+                pending.add(pool.submit(_count_chunk, reader, chunk))
+                if len(pending) >= limit:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    bag = reduce(_merge_larger, (f.result() for f in done), bag)
+            bag = reduce(_merge_larger, (f.result() for f in pending), bag)
+        finally:
+            if executor is None:
+                pool.shutdown()
+        return cls.__from_bag(bag)
+
+    def lazy(self):
+        # opt-in view whose operators build a fused multiset_expression
+        # instead of computing intermediate multisets
+        return multiset_expression(self.__class__, self.__bag)
 
     def count(self, item):
         return self.__bag.get(item, 0)
@@ -79,6 +228,33 @@ class _base_multiset(Set):
     def items(self):
         return self.__bag.items()
 
+    def distinct(self):
+        return self.__bag.keys()
+
+    def counts(self):
+        # read-only element -> multiplicity mapping
+        return MappingProxyType(self.__bag)
+
+    def most_common(self, k=None):
+        # (element, multiplicity) pairs, most common first; a heap selects
+        # the top k without sorting everything
+        if k is None:
+            return sorted(self.items(), key=itemgetter(1), reverse=True)
+        return heapq.nlargest(k, self.items(), key=itemgetter(1))
+
+    def __reduce__(self):
+        return (_restore, (self.__class__, dict(self.items())))
+
+def _count_chunk(reader, chunk):
+    return _count(chunk if reader is None else reader(chunk))
+
+def _merge_larger(bag, counts):
+    # adds the smaller dict into the larger one, both may be updated
+    return _add_counts(bag, counts) if len(bag) >= len(counts) else _add_counts(counts, bag)
+
+def _restore(cls, counts):
+    return cls.from_counts(counts)
+
 
 class _orderable_mixin(object):
     # Using the Dershowitz-Manna ordering that gives a well-founded ordering
@@ -86,53 +262,458 @@ class _orderable_mixin(object):
     # This fails if the union of the sets that are compared has elements that
     # are incomparible
     # https://en.wikipedia.org/wiki/Dershowitz%E2%80%93Manna_ordering
+    __slots__ = ()
 
-    def __le__(self, other):
+    def __compare(self, other):
+        # For a total order on the carrier, M < N iff N has more copies than
+        # M of the largest element whose multiplicities differ, so a single
+        # pass over both bags and one max() decide the comparison. If both
+        # know their order already, walking it from the top stops at the
+        # first difference instead.
         if not (isinstance(other, _orderable_mixin)):
             raise NotImplementedError()
-        # using definition by Huet and Oppen
-        M, N = self.count, other.count
-        S = frozenset(self | other)
-        ys = (y for y in S if M(y) > N(y))
-        return all(any((y < x and M(x) < N(x)) for x in S) for y in ys)
+        if self.__class__ is other.__class__ and isinstance(self, orderable_frozenmultiset):
+            a, b = self.sort_key(), other.sort_key()
+            return (a > b) - (a < b)
+        a, b = self.__known_index(), other.__known_index()
+        if a is not None and b is not None and type(self)._order_key == type(other)._order_key:
+            # only orders by the same keys can be walked side by side
+            return _compare_indexes(a, b)
+        M, N = self._base_multiset__bag, other._base_multiset__bag
+        get = N.get
+        differing = [x for (x, m) in M.items() if get(x, 0) != m]
+        differing.extend(x for x in N if x not in M)
+        if not differing:
+            return 0
+        y = max(differing)
+        return -1 if M.get(y, 0) < N.get(y, 0) else 1
+
+    def _order_key(self, element):
+        # what elements are ordered by
+        return element
+
+    def _key_items(self):
+        key = self._order_key
+        return ((key(e), m) for (e, m) in self.items())
+
+    def sort_key(self):
+        # a tuple that is ordered like the multiset itself: its (element,
+        # multiplicity) pairs in descending order of elements
+        return tuple(sorted(self._key_items(), reverse=True))
+
+    def __known_index(self):
+        try:
+            return self.__index
+        except AttributeError:
+            return None
+
+    def __ordered(self):
+        # The order index, built on first use. Frozen multisets keep it,
+        # orderable_multiset updates it with every change.
+        index = self.__known_index()
+        if index is None:
+            key = self._order_key
+            index = self.__index = _order_index(sorted(((key(e), e, m)
+                for (e, m) in self.items()), key=itemgetter(0)))
+        return index
+
+    def min(self):
+        index = self.__ordered()
+        if not len(index):
+            raise ValueError("min() of an empty multiset")
+        return index.nth(0)
+
+    def max(self):
+        index = self.__ordered()
+        if not len(index):
+            raise ValueError("max() of an empty multiset")
+        return index.nth(len(index) - 1)
+
+    def nth(self, k):
+        # the element at position k of the sorted elements, with repetitions
+        index = self.__ordered()
+        if k < 0:
+            k += len(index)
+        if not 0 <= k < len(index):
+            raise IndexError("multiset index out of range")
+        return index.nth(k)
+
+    def rank(self, x):
+        # the number of elements smaller than x
+        return self.__ordered().rank(self._order_key(x))
+
+    def count_range(self, lo, hi):
+        # the number of elements x with lo <= x < hi
+        index, key = self.__ordered(), self._order_key
+        return max(0, index.rank(key(hi)) - index.rank(key(lo)))
+
+    def ordered(self):
+        # iterates the elements with repetitions in ascending order
+        return self.__ordered().ordered()
+
+    def __le__(self, other):
+        return self.__compare(other) <= 0
 
     def __lt__(self, other):
-        if not (isinstance(other, _orderable_mixin)):
-            raise NotImplementedError()
-        return self != other and self <= other
+        return self.__compare(other) < 0
 
     def __gt__(self, other):
-        return not (self <= other)
+        return self.__compare(other) > 0
 
     def __ge__(self, other):
-        return not (self < other)
+        return self.__compare(other) >= 0
+
+def _compare_indexes(a, b):
+    # walks the (key, multiplicity) pairs of two orders from the largest down
+    others = b.descending()
+    for (ka, ma) in a.descending():
+        pair = next(others, None)
+        if pair is None:
+            return 1
+        kb, mb = pair
+        if ka != kb:
+            return 1 if ka > kb else -1
+        if ma != mb:
+            return 1 if ma > mb else -1
+    return -1 if next(others, None) is not None else 0
+
+# distinct elements per block of an order index, blocks split at twice that
+_ORDER_BLOCK = 256
+
+class _order_index(object):
+    # The distinct elements of a multiset in ascending order of their keys,
+    # in blocks of keys, elements and multiplicities, and a Fenwick tree over
+    # the blocks' total multiplicities. Queries bisect to a block or descend
+    # the tree in O(log n); changing a multiplicity inserts into or deletes
+    # from a single block and updates the tree in O(log n).
+    # https://en.wikipedia.org/wiki/Fenwick_tree
+    __slots__ = ('__keys', '__elements', '__counts', '__maxes', '__tree', '__total')
+
+    def __init__(self, ordered):
+        # ordered: (key, element, multiplicity) in ascending order of keys
+        blocks = [ordered[i:i + _ORDER_BLOCK] for i in range(0, len(ordered), _ORDER_BLOCK)]
+        self.__keys = [[k for (k, _, _) in b] for b in blocks]
+        self.__elements = [[e for (_, e, _) in b] for b in blocks]
+        self.__counts = [[m for (_, _, m) in b] for b in blocks]
+        self.__rebuild()
+
+    def __rebuild(self):
+        # block maxima and tree after blocks were added or removed, in O(blocks)
+        self.__maxes = [keys[-1] for keys in self.__keys]
+        tree = self.__tree = [0] * (len(self.__counts) + 1)
+        for i, counts in enumerate(self.__counts, 1):
+            tree[i] += sum(counts)
+            j = i + (i & -i)
+            if j < len(tree):
+                tree[j] += tree[i]
+        self.__total = self.__before(len(self.__counts))
+
+    def __before(self, b):
+        # total multiplicity of the blocks before block b
+        tree, total = self.__tree, 0
+        while b:
+            total += tree[b]
+            b -= b & -b
+        return total
+
+    def __len__(self):
+        return self.__total
+
+    def set(self, key, element, m):
+        # makes m the multiplicity of element, removing it if m is 0
+        b = bisect_left(self.__maxes, key)
+        if b == len(self.__maxes):
+            if not m:
+                return
+            if not b:
+                self.__keys, self.__elements, self.__counts = [[key]], [[element]], [[m]]
+                return self.__rebuild()
+            b -= 1
+        keys, elements, counts = self.__keys[b], self.__elements[b], self.__counts[b]
+        i = bisect_left(keys, key)
+        if i < len(keys) and keys[i] == key:
+            delta = m - counts[i]
+            if m:
+                counts[i] = m
+            else:
+                del keys[i], elements[i], counts[i]
+                if not keys:
+                    del self.__keys[b], self.__elements[b], self.__counts[b]
+                    return self.__rebuild()
+        elif m:
+            delta = m
+            keys.insert(i, key)
+            elements.insert(i, element)
+            counts.insert(i, m)
+            if len(keys) > 2 * _ORDER_BLOCK:
+                for blocks in (self.__keys, self.__elements, self.__counts):
+                    blocks.insert(b + 1, blocks[b][_ORDER_BLOCK:])
+                    del blocks[b][_ORDER_BLOCK:]
+                return self.__rebuild()
+        else:
+            return
+        self.__maxes[b] = keys[-1]
+        self.__total += delta
+        tree, b = self.__tree, b + 1
+        while b < len(tree):
+            tree[b] += delta
+            b += b & -b
+
+    def nth(self, k):
+        # the element at position 0 <= k < len(self) in ascending order
+        tree, b, step = self.__tree, 0, 1
+        while 2 * step < len(tree):
+            step *= 2
+        while step:
+            if b + step < len(tree) and tree[b + step] <= k:
+                b += step
+                k -= tree[b]
+            step //= 2
+        for e, m in zip(self.__elements[b], self.__counts[b]):
+            if k < m:
+                return e
+            k -= m
+
+    def rank(self, key):
+        # the total multiplicity of the elements with smaller keys
+        b = bisect_left(self.__maxes, key)
+        smaller = self.__before(b)
+        if b < len(self.__keys):
+            smaller += sum(self.__counts[b][:bisect_left(self.__keys[b], key)])
+        return smaller
+
+    def ordered(self):
+        return chain.from_iterable(map(repeat, chain.from_iterable(self.__elements),
+            chain.from_iterable(self.__counts)))
+
+    def descending(self):
+        # (key, multiplicity) pairs from the largest key down
+        return zip(chain.from_iterable(map(reversed, reversed(self.__keys))),
+            chain.from_iterable(map(reversed, reversed(self.__counts))))
 
 class multiset(_base_multiset, MutableSet):
-    def add(self, item):
-        self._base_multiset__bag[item] = self.count(item) + 1
+    __slots__ = ('_base_multiset__bag',)
+
+    def add(self, item, n=1):
+        if n < 0:
+            raise ValueError("multiplicities must not be negative")
+        if n:
+            self._base_multiset__bag[item] = self.count(item) + n
+            self._base_multiset__len += n
+
+    def discard(self, item, n=1):
+        # removes up to n copies of item
+        if n < 0:
+            raise ValueError("multiplicities must not be negative")
+        bag = self._base_multiset__bag
+        have = bag.get(item, 0)
+        if have > n:
+            bag[item] = have - n
+            self._base_multiset__len -= n
+        elif have:
+            del bag[item]
+            self._base_multiset__len -= have
+
+    def update(self, items):
+        # adds the elements of an iterable or a multiset, or the
+        # multiplicities of an element -> multiplicity mapping
+        if isinstance(items, Mapping):
+            self += self.from_counts(items)
+        elif isinstance(items, _base_multiset):
+            self += items
+        else:
+            bag = self._base_multiset__bag
+            _count_elements(bag, items)
+            if type(items) in _SIZED:
+                self._base_multiset__len += len(items)
+            else:
+                self._base_multiset__len = sum(bag.values())
 
-    def discard(self, item):
+    def subtract(self, items):
+        # removes the elements of an iterable or a multiset, or the
+        # multiplicities of an element -> multiplicity mapping
+        if isinstance(items, Mapping):
+            items = self.from_counts(items)
+        self -= items
+
+    def __inplace(self, merge, other):
         bag = self._base_multiset__bag
-        if item in bag:
-            bag[item] = bag[item] - 1
-            if bag[item] == 0:
-                del bag[item]
+        counts = self._base_multiset__counts(other)
+        if counts is bag:
+            counts = dict(counts)
+        result = merge(bag, counts)
+        if result is not bag:
+            # & builds a new dict; the bag itself is kept, lazy expressions
+            # refer to it
+            bag.clear()
+            bag.update(result)
+        self._base_multiset__len = sum(bag.values())
+        return self
+
+    __isub__ = partialmethod(__inplace, _sub_counts)
+    __iadd__ = partialmethod(__inplace, _add_counts)
+    __ior__ = partialmethod(__inplace, _or_counts)
+    __iand__ = partialmethod(__inplace, _and_counts)
+    __ixor__ = partialmethod(__inplace, _xor_counts)
 
 class frozenmultiset(_base_multiset, Hashable):
+    # Up to _COMPACT_LIMIT distinct elements are stored in a single tuple of
+    # the elements, ordered by hash, followed by their multiplicities. That
+    # takes about half the memory of a dict and count() scans it in C. Larger
+    # multisets keep their dict as hash index.
+    __slots__ = ('__store', '__hash')
+
+    def __get_bag(self):
+        store = self.__store
+        if isinstance(store, dict):
+            return store
+        k = len(store) // 2
+        return dict(zip(store[:k], store[k:]))
+
+    def __set_bag(self, bag):
+        if len(bag) > _COMPACT_LIMIT:
+            self.__store = bag
+        else:
+            elements = sorted(bag, key=hash)
+            self.__store = tuple(elements) + tuple(map(bag.__getitem__, elements))
+
+    _base_multiset__bag = property(__get_bag, __set_bag)
+
+    def count(self, item):
+        store = self.__store
+        if isinstance(store, dict):
+            return store.get(item, 0)
+        # tuple.index doesn't hash, but unhashable items raise like dict lookups
+        hash(item)
+        k = len(store) // 2
+        try:
+            return store[k + store.index(item, 0, k)]
+        except ValueError:
+            return 0
+        except NotImplementedError:
+            # elements like multisets refuse to be compared to other types
+            return self.__get_bag().get(item, 0)
+
+    def __contains__(self, item):
+        return self.count(item) > 0
+
+    def items(self):
+        store = self.__store
+        if isinstance(store, dict):
+            return store.items()
+        k = len(store) // 2
+        return zip(store[:k], store[k:])
+
+    def distinct(self):
+        store = self.__store
+        if isinstance(store, dict):
+            return store.keys()
+        return store[:len(store) // 2]
+
+    def __eq__(self, other):
+        if isinstance(other, frozenmultiset):
+            # equal compact tuples hold the same elements and multiplicities
+            a, b = self.__store, other.__store
+            try:
+                if a is b or (type(a) is tuple and type(b) is tuple and a == b):
+                    return True
+            except NotImplementedError:
+                pass
+        return _base_multiset.__eq__(self, other)
+
+    def save(self, path):
+        # writes the multiset to a file that open_mmap() maps into memory
+        save_counts(path, self._base_multiset__bag)
+
+    @classmethod
+    def open_mmap(cls, path):
+        # read-only, memory-mapped view of a file written by save(), see mapped.py
+        return mapped_multiset(path, cls)
+
     def __hash__(self):
-        from operator import xor
-        pots = (hash(key)**value for (key, value) in self.items())
-        return reduce(xor, pots, hash(())) ^ hash(self.__class__)
+        # computed once, as the multiset is immutable. Hashing the frozenset of
+        # (element, multiplicity) pairs runs in C, stays fixed-size for any
+        # multiplicity and does not depend on the class, so equal frozen
+        # multisets of different variants hash equal.
+        try:
+            return self.__hash
+        except AttributeError:
+            self.__hash = hash(frozenset(self.items()))
+            return self.__hash
 
 class orderable_multiset(_orderable_mixin, multiset):
-    pass
+    __slots__ = ('_orderable_mixin__index',)
+
+    def __reindex(self, elements):
+        # updates the order index, if a query built one, for changed elements
+        index = self._orderable_mixin__known_index()
+        if index is not None:
+            get, key = self._base_multiset__bag.get, self._order_key
+            try:
+                for e in elements:
+                    index.set(key(e), e, get(e, 0))
+            except TypeError:
+                # incomparable elements: the next query rebuilds it and raises
+                self._orderable_mixin__index = None
+
+    def add(self, item, n=1):
+        multiset.add(self, item, n)
+        self.__reindex((item,))
+
+    def discard(self, item, n=1):
+        multiset.discard(self, item, n)
+        self.__reindex((item,))
+
+    def update(self, items):
+        if self._orderable_mixin__known_index() is None or isinstance(items, (Mapping, _base_multiset)):
+            return multiset.update(self, items)
+        items = list(items)
+        multiset.update(self, items)
+        self.__reindex(set(items))
+
+    def __mutating(name):
+        # in-place operators that update the order index for the elements
+        # they change: those of the other operand, or all for &=
+        def mutate(self, other):
+            if self._orderable_mixin__known_index() is None:
+                return getattr(multiset, name)(self, other)
+            if not isinstance(other, _base_multiset):
+                other = multiset._base_multiset__from_bag(self._base_multiset__counts(other))
+            changed = list((self if name == '__iand__' else other)._base_multiset__bag)
+            getattr(multiset, name)(self, other)
+            self.__reindex(changed)
+            return self
+        return mutate
+
+    __isub__ = __mutating('__isub__')
+    __iadd__ = __mutating('__iadd__')
+    __ior__ = __mutating('__ior__')
+    __iand__ = __mutating('__iand__')
+    __ixor__ = __mutating('__ixor__')
+    del __mutating
 
 class orderable_frozenmultiset(_orderable_mixin, frozenmultiset):
-    pass
+    __slots__ = ('__sort_key', '_orderable_mixin__index')
+
+    def sort_key(self):
+        # computed once, as the multiset is immutable
+        try:
+            return self.__sort_key
+        except AttributeError:
+            self.__sort_key = _orderable_mixin.sort_key(self)
+            return self.__sort_key
 
 class nestable_orderable_frozenmultiset(orderable_frozenmultiset):
     # Natural multiset extension for nested multisets over an orderable carrier
     # again gives a well-founded total ordering
+    __slots__ = ()
+
+    def _order_key(self, element):
+        # nested multisets are greater than all elements of the carrier
+        if isinstance(element, nestable_orderable_frozenmultiset):
+            return (1, element.sort_key())
+        return (0, element)
+
     def __gt__(self, other):
         if not isinstance(other, self.__class__):
             return True
@@ -152,3 +733,128 @@ class nestable_orderable_frozenmultiset(orderable_frozenmultiset):
         if not isinstance(other, self.__class__):
             return False
         return super(self.__class__, self).__le__(other)
+
+def _lazy_add(l, r):
+    return lambda x: l(x) + r(x)
+
+def _lazy_sub(l, r):
+    def amount(x):
+        a = l(x)
+        return max(a - r(x), 0) if a else 0
+    return amount
+
+def _lazy_or(l, r):
+    return lambda x: max(l(x), r(x))
+
+def _lazy_and(l, r):
+    def amount(x):
+        a = l(x)
+        return min(a, r(x)) if a else 0
+    return amount
+
+def _lazy_xor(l, r):
+    return lambda x: abs(l(x) - r(x))
+
+class multiset_expression(object):
+    # A lazy expression over multisets. Its count function is fused from the
+    # operands' counts once, so count(), in, len(), iteration and
+    # materialize() evaluate the whole expression in one pass over the
+    # candidate elements without intermediate multisets. Leaves refer to the
+    # operands' counts, so changes to mutable operands show through.
+    __slots__ = ('__cls', '__count', '__candidates', '__contains', '__size')
+
+    def __init__(self, cls, bag):
+        self.__cls = cls
+        get = bag.get
+        self.__count = lambda x: get(x, 0)
+        self.__candidates = lambda: iter(bag)
+        # whether x is among the candidates, and an upper bound of their number
+        self.__contains = bag.__contains__
+        self.__size = lambda: len(bag)
+
+    def __operand(self, other):
+        if isinstance(other, multiset_expression):
+            return other
+        if isinstance(other, _base_multiset):
+            return other.lazy()
+        if isinstance(other, Iterable):
+            return multiset_expression(self.__cls, _count(other))
+        raise NotImplementedError()
+
+    def __node(self, fuse, union, other):
+        l, r = self, self.__operand(other)
+        node = multiset_expression.__new__(multiset_expression)
+        node.__cls = l.__cls
+        node.__count = fuse(l.__count, r.__count)
+        lc, rc = l.__contains, r.__contains
+        if union:
+            # each candidate once: right ones are skipped if left has them
+            node.__candidates = lambda: chain(l.__candidates(),
+                (x for x in r.__candidates() if not lc(x)))
+            node.__contains = lambda x: lc(x) or rc(x)
+            node.__size = lambda: l.__size() + r.__size()
+        elif fuse is _lazy_and:
+            # intersections only need to walk the smaller side
+            def candidates():
+                small, large = (l, r) if l.__size() <= r.__size() else (r, l)
+                contains = large.__contains
+                return (x for x in small.__candidates() if contains(x))
+            node.__candidates = candidates
+            node.__contains = lambda x: lc(x) and rc(x)
+            node.__size = lambda: min(l.__size(), r.__size())
+        else:
+            node.__candidates = l.__candidates
+            node.__contains = lc
+            node.__size = l.__size
+        return node
+
+    __add__ = partialmethod(__node, _lazy_add, True)
+    __sub__ = partialmethod(__node, _lazy_sub, False)
+    __or__ = partialmethod(__node, _lazy_or, True)
+    __and__ = partialmethod(__node, _lazy_and, False)
+    __xor__ = partialmethod(__node, _lazy_xor, True)
+
+    def count(self, item):
+        return self.__count(item)
+
+    def __contains__(self, item):
+        return self.__count(item) > 0
+
+    def items(self):
+        count = self.__count
+        for x in self.__candidates():
+            amount = count(x)
+            if amount > 0:
+                yield x, amount
+
+    def __len__(self):
+        return sum(amount for (_, amount) in self.items())
+
+    def __iter__(self):
+        return chain.from_iterable(starmap(repeat, self.items()))
+
+    def materialize(self):
+        # the multiset of the class of the leftmost operand
+        return self.__cls._base_multiset__from_bag(dict(self.items()))
+
+def sum_many(multisets, cls=None):
+    # the sum of many multisets (or iterables of elements) into a single
+    # accumulator, instead of a new multiset for every + of reduce(). The
+    # result is of cls, by default the class of the first multiset.
+    multisets = list(multisets)
+    if cls is None:
+        cls = next((m.__class__ for m in multisets[:1] if isinstance(m, _base_multiset)), multiset)
+    counts = [m._base_multiset__bag if isinstance(m, _base_multiset) else _count(m)
+        for m in multisets]
+    if not counts:
+        return cls()
+    # only the largest is copied, the others are added to it
+    largest = max(range(len(counts)), key=lambda i: len(counts[i]))
+    bag = dict(counts.pop(largest))
+    for c in counts:
+        _add_counts(bag, c)
+    return cls._base_multiset__from_bag(bag)
+
+def sort_key(ms):
+    # key function for sorted(), min(), heapq, ... over orderable multisets
+    return ms.sort_key()
@@ -0,0 +1,128 @@
+# Opt-in instrumentation of the costly operations of puredict and the
+# multisets. While profiling is enabled the instrumented methods are replaced
+# by wrappers that record into the active stats; disabling puts the original
+# methods back, so there is no overhead at all otherwise.
+#
+#     with profiling.profile() as stats:
+#         ...
+#     stats['multiset.combine'].time
+#
+# Recorded operations, each with calls, size, max_size and time:
+#   puredict.lookup   __getitem__/get and `in`; size is the number of trie
+#                     levels walked (0 for flat snapshots)
+#   multiset.combine  the binary operators + - | & ^ and their in-place
+#                     variants; size is the number of elements of both operands
+#   multiset.compare  comparisons of orderable multisets; size as above
+#   multiset.hash     hash() of frozen multisets; size is the number of elements
+from contextlib import contextmanager
+from timeit import default_timer
+try: # Python compat < 3.3
+    from collections.abc import Sized
+except ImportError:
+    from collections import Sized
+from . import hamt, puredict, multisets
+
+class operation_stats(object):
+    __slots__ = ('calls', 'size', 'max_size', 'time')
+
+    def __init__(self):
+        self.calls = self.size = self.max_size = 0
+        self.time = 0.0
+
+    def __repr__(self):
+        return 'operation_stats(calls=%d, size=%d, max_size=%d, time=%f)' % (
+            self.calls, self.size, self.max_size, self.time)
+
+class profile_stats(dict):
+    # operation name -> operation_stats, created on first use
+    def __missing__(self, name):
+        stats = self[name] = operation_stats()
+        return stats
+
+# stats of every enabled profile
+_active = []
+_patched = []
+_levels = [0]
+
+def _record(name, size, time):
+    for stats in _active:
+        op = stats[name]
+        op.calls += 1
+        op.size += size
+        op.time += time
+        if size > op.max_size:
+            op.max_size = size
+
+def _size(ms):
+    return len(ms) if isinstance(ms, Sized) else 0
+
+def _patch(cls, name, wrap):
+    _patched.append((cls, name, vars(cls)[name]))
+    setattr(cls, name, wrap(getattr(cls, name)))
+
+def _timed(operation, size):
+    def wrap(method):
+        def timed(self, *args):
+            n, start = size(self, *args), default_timer()
+            try:
+                return method(self, *args)
+            finally:
+                _record(operation, n, default_timer() - start)
+        return timed
+    return wrap
+
+def _counting_find(method):
+    def find(self, *args):
+        _levels[0] += 1
+        return method(self, *args)
+    return find
+
+def _lookup(method):
+    def lookup(self, key):
+        _levels[0] = 0
+        start = default_timer()
+        try:
+            return method(self, key)
+        finally:
+            _record('puredict.lookup', _levels[0], default_timer() - start)
+    return lookup
+
+def _install():
+    for node in (hamt.bitmap_node, hamt.collision_node):
+        _patch(node, 'find', _counting_find)
+    for name in ('__getitem__', '__contains__'):
+        _patch(puredict.puredict_base, name, _lookup)
+    operands = lambda self, other: len(self) + _size(other)
+    for name in ('__add__', '__sub__', '__or__', '__and__', '__xor__'):
+        _patch(multisets._base_multiset, name, _timed('multiset.combine', operands))
+        _patch(multisets.multiset, name.replace('__', '__i', 1), _timed('multiset.combine', operands))
+    _patch(multisets._orderable_mixin, '_orderable_mixin__compare', _timed('multiset.compare', operands))
+    _patch(multisets.frozenmultiset, '__hash__', _timed('multiset.hash', len))
+
+def _uninstall():
+    while _patched:
+        cls, name, original = _patched.pop()
+        setattr(cls, name, original)
+
+def enable(stats=None):
+    # starts recording into stats (a new profile_stats by default) until
+    # disable(stats) and returns it; several can be enabled at once
+    stats = profile_stats() if stats is None else stats
+    if not _active:
+        _install()
+    _active.append(stats)
+    return stats
+
+def disable(stats):
+    # by identity, as equal stats may be enabled twice
+    del _active[next(i for (i, s) in enumerate(_active) if s is stats)]
+    if not _active:
+        _uninstall()
+
+@contextmanager
+def profile():
+    stats = enable()
+    try:
+        yield stats
+    finally:
+        disable(stats)
@@ -2,47 +2,213 @@ try: # Python 2.7 compat
     from collections.abc import Mapping, Iterable
 except ImportError:
     from collections import Mapping, Iterable
-from itertools import chain
 from functools import reduce
-from .common import _raise
+from itertools import chain
+from . import hamt
+from .mapped import save_mapping, mapped_dict
+
+_missing = hamt.MISSING
+
+def _from_root(root, length, hash_):
+    d = object.__new__(puredict)
+    d._root = root
+    d._flat = None
+    d._len = length
+    d._hash = hash_
+    return d
+
+def _from_dict(flat):
+    # bulk loaded dictionaries keep a private dict as a flat snapshot and only
+    # build their trie once another version is derived from them
+    if not flat:
+        return _EMPTY
+    d = object.__new__(puredict)
+    d._root = None
+    d._flat = flat
+    d._len = len(flat)
+    d._hash = None
+    return d
+
+def _trie(d):
+    if d._root is None:
+        d._root = hamt.from_dict(d._flat)
+    return d._root
+
+def _item_hash(parent_hash, key, value, old):
+    # hashes are kept as the xor of all item hashes so that a single update
+    # is O(1); None means that an item is unhashable or the parent's hash
+    # was unknown
+    if parent_hash is None:
+        return None
+    try:
+        h = parent_hash ^ hash((key, value))
+        return h if old is _missing else h ^ hash((key, old))
+    except TypeError:
+        return None
 
 def empty(_ = None):
-    class __puredict(puredict_base):
-        __getitem__ = lambda _, __: _raise(KeyError())
-        __contains__ = lambda _, __: False
-        __iter__ = lambda _: iter(())
-        items = lambda _: iter(())
-    return __puredict()
+    return _EMPTY
 
 def insert(parent, key, value):
-    class __puredict(puredict_base):
-        __getitem__ = lambda _, _key: value if (key == _key) else parent[_key]
-        __contains__ = lambda _, _key: (key == _key) or (_key in parent)
-        __iter__ = lambda _: chain((key,), (k for k in parent if not key == k))
-        items = lambda _: chain(((key, value),), ((k, v) for (k, v) in parent.items() if not key == k))
-    return __puredict()
+    root, old = hamt.assoc(_trie(parent), key, value)
+    if root is parent._root:
+        return parent
+    return _from_root(root, parent._len + (old is _missing),
+        _item_hash(parent._hash, key, value, old))
 
 def delete(parent, key):
-    class __puredict(puredict_base):
-        __getitem__ = lambda _, _key: _raise(KeyError()) if (key == _key) else parent[_key]
-        __contains__ = lambda _, _key: (not key == _key) and (_key in parent)
-        __iter__ = lambda _: (_key for _key in parent if not key == _key)
-        items = lambda _: ((k, v) for (k, v) in parent.items() if not key == k)
-    return __puredict()
+    root, old = hamt.without(_trie(parent), key)
+    if old is _missing:
+        return parent
+    return _from_root(root, parent._len - 1,
+        _item_hash(parent._hash, key, old, _missing))
+
+def update(parent, items=(), **kwargs):
+    # applies all changes of a mapping or iterable of pairs (and keyword
+    # arguments) at once, giving a single new version
+    changes = dict(items, **kwargs)
+    root, replaced = hamt.assoc_many(_trie(parent), changes)
+    if root is parent._root:
+        return parent
+    h = parent._hash
+    if h is not None:
+        try:
+            h = reduce(lambda h, item: h ^ hash(item), chain(changes.items(), replaced), h)
+        except TypeError:
+            h = None
+    return _from_root(root, parent._len + len(changes) - len(replaced), h)
+
+def delete_many(parent, keys):
+    root, removed = hamt.without_many(_trie(parent), list(dict.fromkeys(keys)))
+    if not removed:
+        return parent
+    h = parent._hash
+    if h is not None:
+        h = reduce(lambda h, item: h ^ hash(item), removed, h)
+    return _from_root(root, parent._len - len(removed), h)
+
+def merge(parent, other, resolve=None):
+    # like update, but for keys present in both resolve(value, other_value)
+    # gives the new value instead of other's value
+    if resolve is None:
+        return update(parent, other)
+    changes = dict(other)
+    for key, value in changes.items():
+        old = parent.get(key, _missing)
+        if old is not _missing:
+            changes[key] = resolve(old, value)
+    return update(parent, changes)
+
+def compact(d):
+    # flat snapshot with the same contents whose lookups and iteration run at
+    # dict speed; it shares d's trie for deriving new versions
+    if d._flat is not None or not d._len:
+        return d
+    c = _from_dict(dict(d.items()))
+    c._root = d._root
+    c._hash = d._hash
+    return c
+
+def depth(d):
+    # number of trie levels a lookup walks at most, 0 for flat snapshots
+    return 0 if d._flat is not None else d._root.depth()
+
+def save(d, path):
+    # writes the items to a file that open_mmap() maps into memory
+    save_mapping(path, d)
+
+def open_mmap(path):
+    # read-only, memory-mapped mapping view of a file written by save(),
+    # see mapped.py
+    return mapped_dict(path)
+
+def diff(a, b):
+    # the changes from a to b as three dicts: added {key: new value},
+    # removed {key: old value} and changed {key: (old value, new value)}.
+    # Versions derived from each other share all untouched subtrees, which
+    # are skipped, so this takes time in the number of changes.
+    added, removed, changed = {}, {}, {}
+    if a._root is None and b._root is None:
+        changes = hamt.diff_mappings(a._flat, b._flat)
+    else:
+        changes = hamt.diff(_trie(a), _trie(b))
+    for key, old, new in changes:
+        if old is _missing:
+            added[key] = new
+        elif new is _missing:
+            removed[key] = old
+        else:
+            changed[key] = (old, new)
+    return added, removed, changed
+
+def _equal(self, other):
+    if not isinstance(other, puredict_base):
+        return Mapping.__eq__(self, other)
+    if self is other or (self._root is not None and self._root is other._root):
+        return True
+    if self._len != other._len:
+        return False
+    if self._hash is not None and other._hash is not None and self._hash != other._hash:
+        return False
+    if self._root is not None and other._root is not None:
+        # stops at the first difference and skips shared subtrees
+        return next(hamt.diff(self._root, other._root), None) is None
+    if self._flat is not None and other._flat is not None:
+        return self._flat == other._flat
+    flat, d = (self, other) if self._flat is not None else (other, self)
+    return flat._flat == dict(d.items())
+
+def _getitem(self, key):
+    if self._flat is not None:
+        return self._flat[key]
+    value = hamt.find(self._root, key, _missing)
+    if value is _missing:
+        raise KeyError(key)
+    return value
+
+def _hash_items(self):
+    if self._hash is None:
+        self._hash = reduce(lambda h, item: h ^ hash(item), self.items(), hash(puredict_base))
+    return self._hash
 
 class puredict_base(Mapping):
+    # the data lives in a persistent hash array mapped trie (see hamt.py) so
+    # lookups are O(log32 n) in the number of keys and every update shares
+    # all untouched nodes with the version it was derived from
+    __slots__ = ('_root', '_flat', '_len', '_hash')
     empty = empty
     insert = insert
     delete = delete
-    __len__ = lambda self: sum(1 for _ in self.items())
-    __hash__ = lambda self: hash(frozenset(self.items())) ^ hash(puredict_base)
+    update = update
+    delete_many = delete_many
+    merge = merge
+    compact = compact
+    depth = depth
+    save = save
+    diff = diff
+    __getitem__ = _getitem
+    __contains__ = lambda self, key: (key in self._flat) if self._flat is not None \
+        else (hamt.find(self._root, key, _missing) is not _missing)
+    __iter__ = lambda self: iter(self._flat) if self._flat is not None \
+        else (k for (k, _) in self._root.items())
+    items = lambda self: iter(self._flat.items()) if self._flat is not None \
+        else self._root.items()
+    __len__ = lambda self: self._len
+    __eq__ = _equal
+    __hash__ = _hash_items
     __repr__  = lambda self: repr(dict(self))
+    # pickles as a plain dict of the live items that unpickles to a snapshot
+    __reduce__ = lambda self: (_from_dict, (self._flat if self._flat is not None
+        else dict(self.items()),))
 
 class puredict(puredict_base):
-    from_iterable = staticmethod(lambda it: reduce(lambda x, y: insert(x, *y), it, empty()))
-    from_mapping = staticmethod(lambda mapping: puredict.from_iterable(mapping.items()))
+    __slots__ = ()
+    from_iterable = staticmethod(lambda it: _from_dict(dict(it)))
+    from_mapping = staticmethod(lambda mapping: _from_dict(dict(mapping)))
     __new__ = lambda cls, *args, **kwargs: \
         next((cons(args[0]) for (typeof, cons) in (
             (Mapping, cls.from_mapping),
             (Iterable, cls.from_iterable)
         ) if (args and isinstance(args[0], typeof))), cls.from_mapping(kwargs))
+
+_EMPTY = _from_root(hamt.EMPTY, 0, hash(puredict_base))
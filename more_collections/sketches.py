@@ -0,0 +1,204 @@
+try: # Python compat < 3.3
+    from collections.abc import Set, Iterable, Mapping
+except ImportError:
+    from collections import Set, Iterable, Mapping
+from array import array
+from itertools import chain, repeat, starmap, islice
+from operator import add, itemgetter
+import heapq
+import math
+import random
+try: # Python compat < 3.6
+    from hashlib import blake2b as _digest
+except ImportError:
+    from hashlib import md5 as _digest
+from .multisets import _base_multiset, _count, _checked_counts
+from .mapped import _key_bytes
+
+# A multiset of approximate multiplicities in constant memory: a count-min
+# sketch, depth rows of width counters in one array, each element counted in
+# one counter per row. https://en.wikipedia.org/wiki/Count%E2%80%93min_sketch
+# count(x) is the minimum of x's counters, so it never underestimates and,
+# with probability at least 1 - e^-depth, overestimates by at most
+# e / width * len(self). The most common elements are tracked separately in a
+# heap of a fixed number of candidates.
+#
+# Rows hash with _stable_hash() instead of hash(), which python salts per
+# process for str and bytes, so pickled sketches stay valid and merge in
+# other processes.
+
+_MASK64 = (1 << 64) - 1
+# elements of a stream counted exactly at a time before they go into the sketch
+_CHUNK = 1 << 12
+
+def _stable_hash(item):
+    # hash() for numbers, equal across processes and for equal int and float;
+    # a digest of str, bytes and the canonical pickle of everything else
+    if isinstance(item, (int, float)):
+        return hash(item)
+    if isinstance(item, str):
+        data = b's' + item.encode('utf-8', 'surrogatepass')
+    elif isinstance(item, bytes):
+        data = b'b' + item
+    else:
+        data = b'p' + _key_bytes(item)
+    return int(_digest(data).hexdigest()[:16], 16)
+
+def _unsupported(self, other):
+    raise TypeError("approximate multisets only support +")
+
+class approximate_multiset(Set):
+    __slots__ = ('__table', '__width', '__depth', '__seed', '__rows', '__len',
+        '__top', '__heap', '__track')
+
+    def __init__(self, items=None, width=2048, depth=5, track=64, seed=0):
+        if width < 2 or width & (width - 1):
+            raise ValueError("width must be a power of two")
+        self.__table = array('q', [0]) * (width * depth)
+        self.__width, self.__depth, self.__seed = width, depth, seed
+        # an odd multiplier and an offset for each row, 64 bit multiply-shift
+        # hashing into its width counters
+        rnd, shift = random.Random(seed), 64 - width.bit_length() + 1
+        self.__rows = tuple((r * width, rnd.getrandbits(64) | 1, rnd.getrandbits(64), shift)
+            for r in range(depth))
+        self.__len = 0
+        # tracked element -> estimate when it was last counted, and a heap of
+        # (estimate, element) whose estimates may be lower than the current ones
+        self.__top, self.__heap, self.__track = {}, [], track
+        if isinstance(items, Iterable):
+            self.update(items)
+
+    @classmethod
+    def from_error(cls, epsilon, delta, items=None, track=64, seed=0):
+        # a sketch whose counts exceed the true ones by at most epsilon *
+        # len(self) with probability 1 - delta
+        width = 2
+        while width < math.e / epsilon:
+            width *= 2
+        depth = max(1, int(math.ceil(math.log(1 / delta))))
+        return cls(items, width, depth, track, seed)
+
+    def __counters(self, item):
+        h = _stable_hash(item)
+        return [offset + ((((h * a + b) & _MASK64)) >> shift)
+            for (offset, a, b, shift) in self.__rows]
+
+    def add(self, item, n=1):
+        if n < 0:
+            raise ValueError("multiplicities must not be negative")
+        if n:
+            table, h = self.__table, _stable_hash(item)
+            estimate = None
+            for (offset, a, b, shift) in self.__rows:
+                i = offset + (((h * a + b) & _MASK64) >> shift)
+                table[i] += n
+                if estimate is None or table[i] < estimate:
+                    estimate = table[i]
+            self.__len += n
+            self.__offer(item, estimate)
+
+    def update(self, items):
+        # adds the elements of an iterable or a multiset, or the
+        # multiplicities of an element -> multiplicity mapping. Iterables are
+        # counted in chunks of _CHUNK elements, so memory stays bounded for
+        # streams of any number of distinct elements.
+        add = self.add
+        if isinstance(items, Mapping):
+            chunks = (_checked_counts(items),)
+        elif isinstance(items, _base_multiset):
+            chunks = (items.counts(),)
+        else:
+            it = iter(items)
+            chunks = iter(lambda: _count(islice(it, _CHUNK)), {})
+        for counts in chunks:
+            for element, amount in counts.items():
+                add(element, amount)
+
+    def __offer(self, item, estimate):
+        top, heap = self.__top, self.__heap
+        if item in top:
+            top[item] = estimate
+        elif len(top) < self.__track:
+            top[item] = estimate
+            heapq.heappush(heap, (estimate, len(top), item))
+        elif heap and estimate > heap[0][0]:
+            # refresh outdated entries until the smallest one is current
+            while top[heap[0][2]] != heap[0][0]:
+                _, tie, smallest = heap[0]
+                heapq.heapreplace(heap, (top[smallest], tie, smallest))
+            smallest_estimate, tie, smallest = heap[0]
+            if estimate > smallest_estimate:
+                del top[smallest]
+                top[item] = estimate
+                heapq.heapreplace(heap, (estimate, tie, item))
+
+    def count(self, item):
+        table = self.__table
+        return min(table[i] for i in self.__counters(item))
+
+    def error_bound(self):
+        # count() exceeds the true multiplicity by at most this, with
+        # probability at least 1 - e^-depth
+        return math.e / self.__width * self.__len
+
+    def __contains__(self, item):
+        # may be true for elements never added, like count()
+        return self.count(item) > 0
+
+    def __len__(self):
+        return self.__len
+
+    def most_common(self, k=None):
+        # (element, estimated multiplicity) pairs of the tracked elements,
+        # most common first
+        items = [(x, self.count(x)) for x in self.__top]
+        if k is None:
+            return sorted(items, key=itemgetter(1), reverse=True)
+        return heapq.nlargest(k, items, key=itemgetter(1))
+
+    def distinct(self):
+        # the tracked elements only
+        return self.__top.keys()
+
+    def __iter__(self):
+        # the tracked elements, repeated by their estimated multiplicities
+        return chain.from_iterable(starmap(repeat, self.most_common()))
+
+    def __parameters(self):
+        return (self.__width, self.__depth, self.__seed)
+
+    def __add__(self, other):
+        # the sketch of both streams; requires equal width, depth and seed
+        if not isinstance(other, approximate_multiset):
+            raise NotImplementedError()
+        if self.__parameters() != other.__parameters():
+            raise ValueError("only sketches of equal width, depth and seed can be merged")
+        result = self.__class__(None, self.__width, self.__depth,
+            max(self.__track, other.__track), self.__seed)
+        result.__table = array('q', map(add, self.__table, other.__table))
+        result.__len = self.__len + other.__len
+        for item in set(chain(self.__top, other.__top)):
+            result.__offer(item, result.count(item))
+        return result
+
+    def __eq__(self, other):
+        if not isinstance(other, approximate_multiset):
+            raise NotImplementedError()
+        return self.__parameters() == other.__parameters() and self.__table == other.__table
+
+    __hash__ = None
+    __sub__ = __or__ = __and__ = __xor__ = __le__ = __lt__ = __ge__ = __gt__ = _unsupported
+    __rsub__ = __ror__ = __rand__ = __rxor__ = isdisjoint = _unsupported
+
+    def __reduce__(self):
+        return (_restore, (self.__class__, self.__parameters(), self.__track,
+            self.__table.tobytes(), self.__len, dict(self.__top)))
+
+def _restore(cls, parameters, track, table, length, top):
+    width, depth, seed = parameters
+    result = cls(None, width, depth, track, seed)
+    result._approximate_multiset__table = array('q', table)
+    result._approximate_multiset__len = length
+    for item in top:
+        result._approximate_multiset__offer(item, result.count(item))
+    return result
@@ -0,0 +1,102 @@
+from unittest import TestCase
+from threading import Thread
+from itertools import product
+import pickle
+from more_collections import concurrent_multiset
+from more_collections.multisets import multiset, frozenmultiset
+
+class TestConcurrentMultiset(TestCase):
+
+    def test_api(self):
+        data = ((), 'aab', 'abbbc', 'ccd')
+        for l, r in product(data, repeat=2):
+            cl, cr, ml, mr = concurrent_multiset(l), concurrent_multiset(r, shards=3), multiset(l), multiset(r)
+            self.assertEqual(cl, ml)
+            self.assertEqual(len(cl), len(ml))
+            self.assertEqual(sorted(cl), sorted(ml))
+            self.assertEqual(cl <= cr, ml <= mr)
+            for op in ('__add__', '__sub__', '__or__', '__and__', '__xor__'):
+                result = getattr(cl, op)(cr)
+                self.assertIs(type(result), concurrent_multiset)
+                self.assertEqual(result, getattr(ml, op)(mr))
+                self.assertEqual(getattr(cl, op)(r), getattr(ml, op)(r))
+                inplace, expected = concurrent_multiset(l), multiset(l)
+                getattr(inplace, op.replace('__', '__i', 1))(cr)
+                getattr(expected, op.replace('__', '__i', 1))(mr)
+                self.assertEqual(inplace, expected)
+                self.assertEqual(len(inplace), len(expected))
+
+        ms = concurrent_multiset('abc')
+        ms.add('a', 3)
+        ms.discard('b', 5)
+        ms.update({'d': 2})
+        ms.subtract('ad')
+        self.assertEqual(ms, multiset('aaacd'))
+        self.assertEqual(ms.count('a'), 3)
+        self.assertNotIn('b', ms)
+        self.assertEqual(len(ms), 5)
+        self.assertEqual(ms.most_common(1), [('a', 3)])
+        self.assertEqual(concurrent_multiset.from_counts({'a': 3, 'c': 1, 'd': 1}), ms)
+        self.assertRaises(ValueError, ms.add, 'a', -1)
+        self.assertRaises(TypeError, hash, ms)
+        self.assertEqual(pickle.loads(pickle.dumps(ms)), ms)
+
+        ms.remove('a')
+        self.assertRaises(KeyError, ms.remove, 'b')
+        popped = [ms.pop() for _ in range(len(ms))]
+        self.assertEqual(sorted(popped), ['a', 'a', 'c', 'd'])
+        self.assertEqual(len(ms), 0)
+        self.assertRaises(KeyError, ms.pop)
+        ms.update('abc')
+        ms.clear()
+        self.assertEqual((len(ms), list(ms)), (0, []))
+
+    def test_snapshot(self):
+        ms = concurrent_multiset('aabc')
+        snapshot = ms.snapshot()
+        ms.add('d')
+        self.assertIs(type(snapshot), frozenmultiset)
+        self.assertEqual(snapshot, frozenmultiset('aabc'))
+
+    def test_no_lost_updates(self):
+        threads, rounds, keys = 8, 2000, 10
+        # enough copies of every element that no discard finds it missing
+        ms = concurrent_multiset.from_counts(dict.fromkeys(range(keys), rounds), shards=4)
+
+        def work(t):
+            for i in range(rounds):
+                ms.add(i % keys)
+                if i % 2:
+                    ms.discard((i + t) % keys)
+                if i % 100 == 0:
+                    ms.update([i % keys] * 10)
+                    ms.snapshot()
+
+        workers = [Thread(target=work, args=(t,)) for t in range(threads)]
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+        expected = keys * rounds + threads * (rounds + 10 * (rounds // 100) - rounds // 2)
+        self.assertEqual(len(ms), expected)
+        self.assertEqual(len(ms.snapshot()), expected)
+
+    def test_concurrent_pop(self):
+        # every copy is popped exactly once
+        ms = concurrent_multiset.from_counts(dict.fromkeys(range(50), 40), shards=4)
+        popped = [[] for _ in range(8)]
+
+        def work(t):
+            while True:
+                try:
+                    popped[t].append(ms.pop())
+                except KeyError:
+                    return
+
+        workers = [Thread(target=work, args=(t,)) for t in range(8)]
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+        self.assertEqual(multiset(x for p in popped for x in p), multiset.from_counts(dict.fromkeys(range(50), 40)))
+        self.assertEqual(len(ms), 0)
@@ -0,0 +1,114 @@
+from unittest import TestCase, skipIf
+try:
+    import numpy
+    from more_collections.int_multisets import int_multiset, int_frozenmultiset
+except ImportError:
+    numpy = None
+from more_collections.multisets import multiset
+from itertools import chain, product
+
+@skipIf(numpy is None, "numpy is not installed")
+class TestIntMultisets(TestCase):
+
+    constructors = (int_multiset, int_frozenmultiset) if numpy else ()
+    test_depth = 10
+
+    def test_constructors(self):
+        cnt = 2**self.test_depth
+        for c in self.constructors:
+            self.assertEqual(0, len(c()))
+            ms = c(chain(range(cnt), range(0, cnt, 2)))
+            self.assertEqual(cnt + cnt // 2, len(ms))
+            for i in range(cnt):
+                self.assertEqual(2 - i % 2, ms.count(i))
+                self.assertIn(i, ms)
+            self.assertNotIn(cnt, ms)
+            self.assertNotIn(-1, ms)
+            self.assertNotIn('a', ms)
+            self.assertEqual(ms, c(numpy.array(list(ms))))
+            self.assertEqual(ms, c(ms))
+            self.assertRaises(ValueError, c, [1, -1])
+            self.assertRaises(TypeError, c, [1.5, 2.7])
+            self.assertRaises(TypeError, c, ['3'])
+            self.assertRaises(TypeError, c, numpy.array([1.5, 2.7]))
+            self.assertRaises(TypeError, c, numpy.array(['3']))
+            self.assertEqual(0, len(c(numpy.array([]))))
+
+    def test_operators(self):
+        data = ((), (1, 1, 2, 3, 3, 3), (0, 1, 4, 4), (3, 3, 3, 3, 7))
+        for c, d in product(self.constructors, repeat=2):
+            for l, r in product(data, repeat=2):
+                ml, mr, el, er = c(l), d(r), multiset(l), multiset(r)
+                for op in ('__add__', '__sub__', '__or__', '__and__', '__xor__'):
+                    result = getattr(ml, op)(mr)
+                    self.assertIs(type(result), c)
+                    self.assertEqual(sorted(result), sorted(getattr(el, op)(er)))
+                    self.assertEqual(sorted(getattr(ml, op)(r)), sorted(result))
+                self.assertEqual(ml <= mr, el <= er)
+                self.assertEqual(ml < mr, el < er)
+                self.assertEqual(ml >= mr, el >= er)
+                self.assertEqual(ml == mr, el == er)
+                self.assertEqual(frozenset(ml.items()), frozenset(el.items()))
+            for o in ('foo', 0, frozenset(), multiset()):
+                with self.assertRaises(NotImplementedError):
+                    c() == o
+                with self.assertRaises(NotImplementedError):
+                    c() <= o
+
+    def test_mutable(self):
+        ms = int_multiset()
+        for i in range(100):
+            ms.add(i % 10)
+        self.assertEqual(len(ms), 100)
+        self.assertEqual(ms.count(3), 10)
+        for i in range(15):
+            ms.discard(3)
+        self.assertEqual(ms.count(3), 0)
+        ms.discard(1000)
+        self.assertEqual(len(ms), 90)
+
+        before = ms
+        ms += [1, 1]
+        ms -= [2]
+        ms |= int_frozenmultiset([5] * 20)
+        ms &= range(1, 10)
+        ms ^= [9, 9]
+        self.assertIs(ms, before)
+        self.assertEqual(sorted(ms.items()), [(1, 1), (2, 1), (4, 1), (5, 1), (6, 1), (7, 1), (8, 1), (9, 1)])
+
+        ms = int_multiset.from_counts({3: 2, 0: 1, 7: 0})
+        self.assertEqual(sorted(ms.items()), [(0, 1), (3, 2)])
+        ms.add(3, 4)
+        ms.discard(3, 5)
+        ms.discard(0, 5)
+        ms.update([1, 1])
+        ms.update({2: 3})
+        ms.subtract({2: 1})
+        ms.subtract([1])
+        self.assertEqual(sorted(ms.items()), [(1, 1), (2, 2), (3, 1)])
+        self.assertEqual(int_frozenmultiset.from_counts({}), int_frozenmultiset())
+        self.assertRaises(ValueError, int_multiset.from_counts, {1: -1})
+        self.assertRaises(ValueError, int_multiset.from_counts, {-1: 1})
+        self.assertRaises(TypeError, int_multiset.from_counts, {1.5: 1})
+        self.assertRaises(ValueError, ms.add, 1, -1)
+        self.assertRaises(ValueError, ms.discard, 1, -1)
+
+    def test_reporting(self):
+        for c in self.constructors:
+            ms = c([5] * 7 + list(range(30)) * 2 + [9] * 3)
+            reference = multiset(ms)
+            self.assertEqual(sorted(ms.distinct()), list(range(30)))
+            self.assertEqual(dict(ms.counts()), dict(reference.items()))
+            self.assertEqual(ms.most_common(2), [(5, 9), (9, 5)])
+            for k in (None, 0, 1, 3, 100):
+                self.assertEqual([n for (_, n) in ms.most_common(k)],
+                    [n for (_, n) in reference.most_common(k)])
+            self.assertEqual(c().most_common(), [])
+
+    def test_hashing(self):
+        a = int_frozenmultiset([1, 1, 2])
+        b = int_frozenmultiset(int_multiset([2, 1, 1, 100]) - [100])
+        self.assertEqual(a, b)
+        self.assertEqual(hash(a), hash(b))
+        self.assertEqual(len(set((a, b, int_frozenmultiset([1, 2])))), 2)
+        self.assertRaises(TypeError, hash, int_multiset())
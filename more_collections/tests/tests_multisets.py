@@ -5,6 +5,7 @@ try: # Python compat < 3.3
 except ImportError:
     from collections import Hashable, Set
 from itertools import chain, repeat, product
+import random
 
 class TestPuredict(TestCase):
 
@@ -48,6 +49,27 @@ class TestPuredict(TestCase):
             self.assertEqual(list(repeat(0, cnt)), list(ms))
             self.assertEqual(frozenset((0,)), frozenset(ms))
 
+    def test_reporting(self):
+        for c in self.constructors + (nestable_orderable_frozenmultiset,):
+            for data in ('aaaabbbccd', list(range(30)) * 2 + [5] * 7 + [9] * 3, ''):
+                ms = c(data)
+                self.assertEqual(sorted(ms.distinct()), sorted(set(data)))
+                self.assertEqual(dict(ms.counts()), dict(ms.items()))
+                self.assertEqual(len(ms.counts()), len(set(data)))
+                common = ms.most_common()
+                self.assertEqual(sorted(common), sorted(ms.items()))
+                self.assertEqual([n for (_, n) in common], sorted((n for (_, n) in ms.items()), reverse=True))
+                for k in (0, 1, 3, 100):
+                    self.assertEqual([n for (_, n) in ms.most_common(k)], [n for (_, n) in common[:k]])
+        self.assertEqual(multiset('aaaabbbccd').most_common(2), [('a', 4), ('b', 3)])
+
+        ms = multiset('ab')
+        counts = ms.counts()
+        ms.add('a')
+        self.assertEqual(counts['a'], 2)
+        with self.assertRaises(TypeError):
+            counts['a'] = 5
+
     def test_mutable(self):
         r = 2**self.test_depth
 
@@ -65,6 +87,88 @@ class TestPuredict(TestCase):
                 ms.discard(5)
                 self.assertEqual(len(ms), r - cnt - 1)
 
+    def test_len(self):
+        for c in self.constructors:
+            a, b = c('aaabbc'), c('abd')
+            for ms in (a, b, a + b, a - b, a | b, a & b, a ^ b, b - a, c(), c() + c()):
+                self.assertEqual(len(ms), sum(count for (_, count) in ms.items()))
+        for c in self.constructors_mutable:
+            ms = c('aab')
+            ms.discard('c')
+            ms.discard('b')
+            ms.discard('b')
+            ms.add('d')
+            self.assertEqual(len(ms), 3)
+            # len() of sized iterables that iterate fewer elements is ignored
+            class Short(list):
+                def __len__(self):
+                    return 10
+            ms.update(Short('ab'))
+            ms.update(['a'])
+            self.assertEqual(len(ms), 6)
+
+    def test_bulk_counts(self):
+        for c in self.constructors:
+            ms = c.from_counts({'a': 3, 'b': 0, 'c': 1})
+            self.assertIs(type(ms), c)
+            self.assertEqual(ms, c('aaac'))
+            self.assertEqual(len(ms), 4)
+            self.assertRaises(ValueError, c.from_counts, {'a': -1})
+
+        for c in self.constructors_mutable:
+            ms = c()
+            ms.add('a', 5)
+            ms.add('b')
+            ms.add('c', 0)
+            self.assertEqual(ms, c('aaaaab'))
+            ms.discard('a', 2)
+            ms.discard('b', 7)
+            ms.discard('d', 2)
+            self.assertEqual(ms, c('aaa'))
+            self.assertEqual(len(ms), 3)
+            self.assertRaises(ValueError, ms.add, 'a', -1)
+            self.assertRaises(ValueError, ms.discard, 'a', -1)
+
+            ms.update('abb')
+            ms.update(c('c'))
+            ms.update({'d': 2, 'a': 1})
+            ms.update(x for x in 'e')
+            self.assertEqual(ms, c('aaaaabbcdde'))
+            self.assertEqual(len(ms), 11)
+            ms.subtract('ab')
+            ms.subtract(c('ccc'))
+            ms.subtract({'a': 2, 'd': 1})
+            self.assertEqual(ms, c('aabde'))
+            self.assertEqual(len(ms), 5)
+
+    def test_sum_many(self):
+        from more_collections.multisets import sum_many
+        parts = ['aab', '', 'bc', 'a' * 20, range(10)]
+        for c in self.constructors:
+            total = sum_many(map(c, parts))
+            self.assertIs(type(total), c)
+            self.assertEqual(total, c(chain.from_iterable(parts)))
+            self.assertEqual(len(total), 25 + 10)
+            self.assertEqual(c('aab'), c('aab')) # inputs stay untouched
+            self.assertEqual(sum_many([c('ab'), 'bc', ['a']]), c('aabbc'))
+            self.assertEqual(sum_many([], c), c())
+        self.assertIs(type(sum_many([])), multiset)
+
+    def test_from_parallel(self):
+        from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+        data = [i % 7 for i in range(1000)]
+        with ThreadPoolExecutor(2) as executor:
+            for c in self.constructors:
+                ms = c.from_parallel(iter(data), chunksize=64, executor=executor)
+                self.assertIs(type(ms), c)
+                self.assertEqual(ms, c(data))
+                self.assertEqual(c.from_parallel([], executor=executor), c())
+        lines = ['a b a', 'c', '', 'b b']
+        with ProcessPoolExecutor(2) as executor:
+            ms = frozenmultiset.from_parallel(lines, reader=str.split, executor=executor)
+        self.assertEqual(ms, frozenmultiset('abacbb'))
+        self.assertEqual(multiset.from_parallel(data, chunksize=100), multiset(data))
+
     def test_hashing(self):
         for c in self.constructors_hashing:
             self.assertEqual(hash(c()), hash(c()))
@@ -88,6 +192,105 @@ class TestPuredict(TestCase):
 
             self.assertTrue(isinstance(c(), Hashable))
 
+    def test_hashing_variants(self):
+        hashing = self.constructors_hashing + (nestable_orderable_frozenmultiset,)
+        for c, d in product(hashing, repeat=2):
+            a, b = c('aab'), d('baa')
+            self.assertEqual(a, b)
+            self.assertEqual(hash(a), hash(b))
+
+        big = frozenmultiset.from_counts({'a': 10**9, 'b': 10**12})
+        self.assertEqual(hash(big), hash(frozenmultiset.from_counts({'b': 10**12, 'a': 10**9})))
+        self.assertNotEqual(hash(big), hash(frozenmultiset.from_counts({'a': 10**9, 'b': 1})))
+
+    def test_pickle(self):
+        import pickle
+        for c in self.constructors + (nestable_orderable_frozenmultiset,):
+            for ms in (c(), c('aabc'), c(range(100)), c(chain(range(50), range(20)))):
+                for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+                    copy = pickle.loads(pickle.dumps(ms, protocol))
+                    self.assertIs(type(copy), c)
+                    self.assertEqual(copy, ms)
+                    self.assertEqual(len(copy), len(ms))
+
+    def test_mmap(self):
+        import os, tempfile
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, 'ms')
+        for c in self.constructors_hashing + (nestable_orderable_frozenmultiset,):
+            for ms in (c(), c('aabc'), c(chain(range(50), range(20))), c([(1, 'a'), (1, 'a'), 'a'])):
+                ms.save(path)
+                with c.open_mmap(path) as m:
+                    self.assertEqual(len(m), len(ms))
+                    self.assertEqual(dict(m.items()), dict(ms.items()))
+                    self.assertEqual(sorted(m, key=repr), sorted(ms, key=repr))
+                    for e in ms.distinct():
+                        self.assertEqual(m.count(e), ms.count(e))
+                        self.assertIn(e, m)
+                    self.assertNotIn('z', m)
+                    self.assertRaises(TypeError, m.__contains__, [])
+                    self.assertEqual(m.count(100), 0)
+                    materialized = m.materialize()
+                    self.assertIs(type(materialized), c)
+                    self.assertEqual(materialized, ms)
+        # keys whose pickles depend on hash order, found in other processes
+        import subprocess, sys
+        script = '''if 1:
+            import sys
+            from more_collections import frozenmultiset, orderable_frozenmultiset
+            from more_collections import puredict
+            keys = [frozenmultiset('abcdefgh' * 2), frozenmultiset(map(str, range(20))),
+                orderable_frozenmultiset('xyz'), frozenset('abcdefgh'),
+                puredict.puredict((str(i), i) for i in range(20)),
+                (frozenmultiset([frozenset('ab'), 'c']), 'd')]
+            if sys.argv[1] == 'save':
+                frozenmultiset(keys * 2).save(sys.argv[2])
+            else:
+                with frozenmultiset.open_mmap(sys.argv[2]) as m:
+                    assert [m.count(k) for k in keys] == [2] * len(keys)
+        '''
+        for seed, command in (('1', 'save'), ('2', 'load'), ('3', 'load')):
+            env = dict(os.environ, PYTHONHASHSEED=seed)
+            subprocess.check_call([sys.executable, '-c', script, command, path], env=env)
+
+        # equal keys whose parts are shared objects in one and not the other
+        a = 'xxx'
+        for c in self.constructors_hashing:
+            c([(a, a)]).save(path)
+            with c.open_mmap(path) as m:
+                self.assertEqual(m.count((''.join('xxx'), ''.join('xxx'))), 1)
+        os.remove(path)
+        os.rmdir(directory)
+
+    def test_slots(self):
+        for c in self.constructors + (nestable_orderable_frozenmultiset,):
+            self.assertFalse(hasattr(c('ab'), '__dict__'))
+
+    def test_compact_storage(self):
+        # small and large frozen multisets and elements with colliding hashes
+        class Key(object):
+            def __init__(self, v):
+                self.v = v
+            def __hash__(self):
+                return 1
+            def __eq__(self, other):
+                return isinstance(other, Key) and self.v == other.v
+            def __repr__(self):
+                return 'Key(%d)' % self.v
+
+        for c in self.constructors_hashing:
+            for elements in ([Key(i) for i in (0, 1, 1, 2)], list(range(20)) * 2, 'abcabca'):
+                a, b = c(elements), c(reversed(elements))
+                self.assertEqual(a, b)
+                self.assertEqual(hash(a), hash(b))
+                for e in elements:
+                    self.assertEqual(a.count(e), elements.count(e))
+                self.assertEqual(sorted(map(repr, a)), sorted(map(repr, elements)))
+                self.assertNotEqual(a, c(elements[1:]))
+                # unhashable lookups raise whatever the storage
+                self.assertRaises(TypeError, a.count, [])
+                self.assertRaises(TypeError, a.__contains__, [])
+
     def test_le(self):
 
         for c in self.constructors_unord:
@@ -132,6 +335,23 @@ class TestPuredict(TestCase):
                 with self.assertRaises(NotImplementedError):
                     o == m
 
+    def test_eq_le_fast_paths(self):
+        for c, d in product(self.constructors, repeat=2):
+            a = c('aabc')
+            for other, eq in (('aabc', True), ('abbc', False), ('aabd', False),
+                    ('aab', False), ('aaabc', False), ('aabbc', False)):
+                b = d(other)
+                if c in self.constructors_hashing and d in self.constructors_hashing:
+                    hash(a), hash(b)
+                self.assertEqual(a == b, eq)
+                self.assertEqual(b == a, eq)
+        for c in self.constructors_unord:
+            for small, large, le in (('ab', 'aabc', True), ('aab', 'abc', False),
+                    ('abc', 'aab', False), ('aabc', 'aab', False), ('aaa', 'aaaa', True)):
+                self.assertEqual(c(small) <= c(large), le)
+                self.assertEqual(c(small) < c(large), le)
+                self.assertEqual(c(large) >= c(small), le)
+
     def test_lt(self):
 
         for c in self.constructors_unord:
@@ -194,6 +414,61 @@ class TestPuredict(TestCase):
 
                     self.assertEqual(l ^ r, (l | r) - (l & r))
 
+    def test_inplace_operators(self):
+        import operator
+        ops = (
+            (operator.iadd, operator.add),
+            (operator.isub, operator.sub),
+            (operator.ior, operator.or_),
+            (operator.iand, operator.and_),
+            (operator.ixor, operator.xor),
+        )
+        for c in self.constructors:
+            for l, r in product(('', 'aab', 'abbbc', 'cd'), repeat=2):
+                for iop, op in ops:
+                    expected = op(c(l), c(r))
+                    for other in (r, c(r), multiset(r)):
+                        ms = c(l)
+                        result = iop(ms, other)
+                        self.assertEqual(result, expected)
+                        self.assertEqual(len(result), len(expected))
+                        self.assertIs(type(result), c)
+                        if c in self.constructors_mutable:
+                            self.assertIs(result, ms)
+                    ms = c(l)
+                    self.assertEqual(iop(ms, ms), op(c(l), c(l)))
+
+    def test_lazy(self):
+        import random
+        rnd = random.Random(2)
+        for c in self.constructors:
+            for _ in range(100):
+                a, b, d, e = (c(rnd.randrange(8) for _ in range(rnd.randrange(12))) for _ in range(4))
+                expected = ((a + b) & d) - e ^ (a | e) & (b + 'xy')
+                lazy = ((a.lazy() + b) & d.lazy()) - e ^ (a.lazy() | e) & (b.lazy() + 'xy')
+                result = lazy.materialize()
+                self.assertIs(type(result), c)
+                self.assertEqual(result, expected)
+                self.assertEqual(len(lazy), len(expected))
+                self.assertEqual(sorted(map(str, lazy)), sorted(map(str, expected)))
+                for x in chain(range(9), 'xyz'):
+                    self.assertEqual(lazy.count(x), expected.count(x))
+                    self.assertEqual(x in lazy, x in expected)
+
+        ms = multiset('ab')
+        lazy = ms.lazy() + 'bc'
+        ms.add('c')
+        self.assertEqual(lazy.count('c'), 2)
+        for c in self.constructors_mutable:
+            for op in ('__iadd__', '__isub__', '__ior__', '__iand__', '__ixor__'):
+                ms = c('aab')
+                lazy = ms.lazy() + 'c'
+                getattr(ms, op)(c('ad'))
+                for x in 'abcd':
+                    self.assertEqual(lazy.count(x), ms.count(x) + (x == 'c'))
+        with self.assertRaises(NotImplementedError):
+            ms.lazy() + 5
+
     def test_ordering(self):
         from itertools import combinations, combinations_with_replacement, product
         import operator
@@ -255,6 +530,25 @@ class TestPuredict(TestCase):
                         self.assertRaises(NotImplementedError, o, c(b), c_(a))
 
 
+    def test_ordering_definition(self):
+        import random
+        rnd = random.Random(0)
+
+        def le(M, N):
+            # definition by Huet and Oppen
+            S = frozenset(chain(M, N))
+            ys = (y for y in S if M.count(y) > N.count(y))
+            return all(any((y < x and M.count(x) < N.count(x)) for x in S) for y in ys)
+
+        for c in self.constructors_ord:
+            for _ in range(200):
+                a = c(rnd.randrange(6) for _ in range(rnd.randrange(8)))
+                b = c(rnd.randrange(6) for _ in range(rnd.randrange(8)))
+                self.assertEqual(a <= b, le(a, b))
+                self.assertEqual(a >= b, le(b, a))
+                self.assertEqual(a < b, le(a, b) and a != b)
+                self.assertEqual(a > b, le(b, a) and a != b)
+
     def test_nestable(self):
         from itertools import combinations, combinations_with_replacement, product
 
@@ -297,6 +591,113 @@ class TestPuredict(TestCase):
                 self.assertTrue(a < b or a > b)
                 self.assertTrue(b < a or b > a)
 
+    def test_sort_key(self):
+        import random, heapq
+        from more_collections.multisets import sort_key
+        rnd = random.Random(1)
+        for c in self.constructors_ord + (nestable_orderable_frozenmultiset,):
+            ms = [c(rnd.randrange(6) for _ in range(rnd.randrange(8))) for _ in range(100)]
+            by_key = sorted(ms, key=sort_key)
+            self.assertEqual([m.sort_key() for m in by_key], sorted(m.sort_key() for m in ms))
+            for a, b in zip(by_key, by_key[1:]):
+                self.assertTrue(a <= b)
+                self.assertEqual(a < b, a.sort_key() < b.sort_key())
+            self.assertEqual(min(ms, key=sort_key).sort_key(), by_key[0].sort_key())
+            heap = []
+            for m in ms:
+                heapq.heappush(heap, m)
+            self.assertEqual([heapq.heappop(heap).sort_key() for _ in ms], [m.sort_key() for m in by_key])
+
+        c = nestable_orderable_frozenmultiset
+        nested = [c(), c([1]), c([c([1]), 0]), c([c([1]), c()]), c([c([c()])]), c([5, 5, 5])]
+        self.assertEqual(sorted(nested, key=sort_key), sorted(nested))
+        for a, b in product(nested, repeat=2):
+            self.assertEqual(a < b, a.sort_key() < b.sort_key())
+
+    def test_rank_queries(self):
+        data = [5, 1, 3, 3, 9, 1, 1, 7]
+        for c in self.constructors_ord + (nestable_orderable_frozenmultiset,):
+            ms, ordered = c(data), sorted(data)
+            self.assertEqual(list(ms.ordered()), ordered)
+            self.assertEqual((ms.min(), ms.max()), (1, 9))
+            for k in range(-len(data), len(data)):
+                self.assertEqual(ms.nth(k), ordered[k])
+            self.assertRaises(IndexError, ms.nth, len(data))
+            self.assertRaises(IndexError, ms.nth, -len(data) - 1)
+            for x in range(11):
+                self.assertEqual(ms.rank(x), sum(1 for e in data if e < x))
+                for y in range(11):
+                    self.assertEqual(ms.count_range(x, y), sum(1 for e in data if x <= e < y))
+            self.assertRaises(ValueError, c().min)
+            self.assertRaises(ValueError, c().max)
+            self.assertEqual(list(c().ordered()), [])
+
+        ms = orderable_multiset(data)
+        self.assertEqual(ms.max(), 9)
+        ms.add(10, 2)
+        self.assertEqual((ms.max(), ms.rank(10), ms.nth(-1)), (10, 8, 10))
+        ms.discard(1, 3)
+        self.assertEqual(ms.min(), 3)
+        ms -= [3, 3]
+        ms.update([0])
+        self.assertEqual(list(ms.ordered()), [0, 5, 7, 9, 10, 10])
+        ms &= orderable_multiset([0, 10])
+        self.assertEqual(list(ms.ordered()), [0, 10])
+
+        # the index kept up to date through every kind of change, across
+        # block splits and removals
+        rnd = random.Random(2)
+        ms, reference = orderable_multiset(range(0, 3000, 3)), multiset(range(0, 3000, 3))
+        ms.max()
+        for step in range(300):
+            op, x = rnd.randrange(8), rnd.randrange(3000)
+            others = [rnd.randrange(3000) for _ in range(rnd.choice((20, 200, 3000)))]
+            for m in (ms, reference):
+                if op < 3:
+                    m.add(x, op + 1)
+                elif op == 3:
+                    m.discard(x, 2)
+                elif op == 4:
+                    m.update(others)
+                elif op == 5:
+                    m -= multiset(others)
+                elif op == 6:
+                    m ^= others
+                else:
+                    m |= others[:100]
+                    m &= multiset(others)
+            ordered = sorted(reference)
+            self.assertEqual(len(ms), len(ordered))
+            if ordered:
+                self.assertEqual((ms.min(), ms.max()), (ordered[0], ordered[-1]))
+                k = rnd.randrange(len(ordered))
+                self.assertEqual(ms.nth(k), ordered[k])
+            self.assertEqual(ms.rank(x), sum(1 for e in ordered if e < x))
+        self.assertEqual(list(ms.ordered()), sorted(reference))
+        ms.add('a')
+        self.assertRaises(TypeError, ms.max)
+
+        c = nestable_orderable_frozenmultiset
+        nested = c([c([1]), 7, c(), 2, 2])
+        self.assertEqual(list(nested.ordered()), [2, 2, 7, c(), c([1])])
+        self.assertEqual(nested.rank(c()), 3)
+
+    def test_compare_ordered(self):
+        # comparisons walk the orders once both are built
+        data = ((), (1,), (1, 1), (2,), (1, 2), (3, 1, 1), (3, 2), (0, 3, 2))
+        for a, b in product(data, repeat=2):
+            for c, d in product(self.constructors_ord, repeat=2):
+                x, y = c(a), d(b)
+                expected = (x < y, x <= y, x > y, x >= y)
+                x.rank(0), y.rank(0)
+                self.assertEqual((x < y, x <= y, x > y, x >= y), expected)
+
+        # orders by different keys fall back to comparing the bags
+        x, y = orderable_multiset([1, 3]), nestable_orderable_frozenmultiset([2])
+        expected = (x <= y, y >= x)
+        x.rank(0), y.rank(0)
+        self.assertEqual((x <= y, y >= x), expected)
+
     def test_readme(self):
         # tests from the readme file
         from more_collections import multiset
@@ -0,0 +1,48 @@
+from unittest import TestCase
+from more_collections import puredict, profiling
+from more_collections.multisets import multiset, frozenmultiset, orderable_frozenmultiset
+
+class TestProfiling(TestCase):
+
+    def test_multiset_operations(self):
+        a, b = multiset('aab'), frozenmultiset('abc')
+        with profiling.profile() as stats:
+            self.assertEqual(a + b, multiset('aaabbc'))
+            a |= 'bbb'
+            hash(b)
+            self.assertTrue(orderable_frozenmultiset('a') < orderable_frozenmultiset('b'))
+        self.assertEqual(stats['multiset.combine'].calls, 2)
+        self.assertEqual(stats['multiset.combine'].size, 6 + 6)
+        self.assertEqual(stats['multiset.combine'].max_size, 6)
+        self.assertEqual(stats['multiset.compare'].calls, 1)
+        self.assertEqual(stats['multiset.hash'].size, 3)
+        self.assertTrue(stats['multiset.combine'].time >= 0)
+        self.assertEqual(a, multiset('aabbb'))
+
+    def test_puredict_lookups(self):
+        flat = puredict.puredict((i, i) for i in range(1000))
+        d = flat.insert(-1, -1)
+        with profiling.profile() as stats:
+            self.assertEqual(flat[5], 5)
+            self.assertEqual(d.get(5), 5)
+            self.assertIn(7, d)
+        lookup = stats['puredict.lookup']
+        self.assertEqual(lookup.calls, 3)
+        # the flat snapshot walks no trie levels
+        self.assertTrue(2 <= lookup.size <= 2 * lookup.max_size)
+        self.assertTrue(lookup.max_size <= d.depth())
+
+    def test_disabled(self):
+        from more_collections.multisets import _base_multiset
+        state = lambda: (vars(_base_multiset)['__add__'],
+            vars(puredict.puredict_base)['__getitem__'], vars(frozenmultiset)['__hash__'])
+        originals = state()
+        stats = profiling.enable()
+        outer = profiling.enable()
+        profiling.disable(stats)
+        multiset('a') + multiset('b')
+        profiling.disable(outer)
+        multiset('a') + multiset('b')
+        self.assertEqual(outer['multiset.combine'].calls, 1)
+        self.assertNotIn('multiset.combine', stats)
+        self.assertEqual(originals, state())
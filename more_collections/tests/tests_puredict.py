@@ -1,5 +1,6 @@
 from unittest import TestCase, skip
 from more_collections import puredict
+from itertools import product
 
 class TestPuredict(TestCase):
 
@@ -51,3 +52,226 @@ class TestPuredict(TestCase):
         d = dict([('two', 2), ('one', 1), ('three', 3)])
         e = dict({'three': 3, 'one': 1, 'two': 2})
         self.assertTrue(a == b == c == d == e)
+
+    def test_many_operations(self):
+        import random
+        rnd = random.Random(0)
+        e, d = puredict.empty(), {}
+        for _ in range(2**14):
+            key = rnd.randrange(2**10)
+            if rnd.random() < 0.3:
+                e = e.delete(key)
+                d.pop(key, None)
+            else:
+                e = e.insert(key, -key)
+                d[key] = -key
+        self.assertEqual(dict(e.items()), d)
+        self.assertEqual(len(e), len(d))
+        for key in range(2**10):
+            self.assertEqual(key in e, key in d)
+            self.assertEqual(e.get(key), d.get(key))
+
+    def test_persistence(self):
+        a = puredict.puredict((i, i) for i in range(100))
+        b = a.insert(5, 'x').delete(7)
+        self.assertEqual(a[5], 5)
+        self.assertIn(7, a)
+        self.assertEqual(b[5], 'x')
+        self.assertNotIn(7, b)
+        self.assertIs(a.delete(1000), a)
+
+    def test_hash_collisions(self):
+        class Key(object):
+            def __init__(self, v):
+                self.v = v
+            def __hash__(self):
+                return self.v % 3
+            def __eq__(self, other):
+                return self.v == other.v
+
+        keys = [Key(i) for i in range(30)]
+        e = puredict.puredict((k, k.v) for k in keys)
+        self.assertEqual(len(e), 30)
+        for k in keys:
+            self.assertEqual(e[Key(k.v)], k.v)
+        for k in keys[::2]:
+            e = e.delete(Key(k.v))
+        self.assertEqual(sorted(e.values()), list(range(1, 30, 2)))
+        self.assertRaises(KeyError, e.__getitem__, Key(0))
+
+    def test_diff_and_equality(self):
+        import random
+        rnd = random.Random(0)
+
+        class Key(object):
+            def __init__(self, v):
+                self.v = v
+            def __hash__(self):
+                return self.v % 7
+            def __eq__(self, other):
+                return isinstance(other, Key) and self.v == other.v
+            def __repr__(self):
+                return 'Key(%d)' % self.v
+
+        def expected(a, b):
+            a, b = dict(a.items()), dict(b.items())
+            return ({k: v for (k, v) in b.items() if k not in a},
+                {k: v for (k, v) in a.items() if k not in b},
+                {k: (a[k], b[k]) for k in a if k in b and a[k] != b[k]})
+
+        base = puredict.puredict((i, i) for i in range(500))
+        versions = [base, base.insert(0, 0), puredict.empty(), base.update((Key(i), i) for i in range(20))]
+        for _ in range(20):
+            d = rnd.choice(versions)
+            for _ in range(rnd.randrange(1, 20)):
+                key = rnd.choice((rnd.randrange(600), Key(rnd.randrange(30))))
+                op = rnd.randrange(3)
+                d = d.insert(key, rnd.randrange(3)) if op else d.delete(key)
+            versions.append(d)
+        versions.append(puredict.puredict(dict(versions[-1].items())))
+        versions.append(versions[-2].compact())
+        for a, b in product(versions, repeat=2):
+            self.assertEqual(a.diff(b), expected(a, b))
+            plain = dict(a.items()) == dict(b.items())
+            self.assertEqual((a == b, a != b), (plain, not plain))
+        self.assertEqual(base, dict(base.items()))
+        self.assertNotEqual(base, {})
+        self.assertNotEqual(base, 5)
+        self.assertEqual(base.insert(1, 2).diff(base), ({}, {}, {1: (2, 1)}))
+
+    def test_len_and_hash(self):
+        a = puredict.puredict((i, str(i)) for i in range(100))
+        b = puredict.empty()
+        for i in reversed(range(150)):
+            b = b.insert(i, i)
+        for i in range(100, 150):
+            b = b.delete(i)
+        for i in range(100):
+            b = b.insert(i, str(i))
+        self.assertEqual(len(a), 100)
+        self.assertEqual(len(b), 100)
+        self.assertEqual(len(b.delete(1000)), 100)
+        self.assertEqual(len(b.insert(5, 'x')), 100)
+        self.assertEqual(a, b)
+        self.assertEqual(hash(a), hash(b))
+
+        c = a.insert('list', [])
+        self.assertRaises(TypeError, hash, c)
+        self.assertEqual(hash(c.delete('list')), hash(a))
+        self.assertEqual(len(set((a, b, a.insert(0, 0).insert(0, '0')))), 1)
+
+    def test_bulk_construction(self):
+        from more_collections import hamt
+        items = [(str(i % 700), i) for i in range(1000)]
+        expected = dict(items)
+        e = puredict.puredict(items)
+        self.assertEqual(len(e), len(expected))
+        self.assertEqual(dict(e.items()), expected)
+        self.assertEqual(e, puredict.puredict(iter(items)))
+        self.assertIs(puredict.puredict([]), puredict.empty())
+
+        # deriving from a bulk loaded dictionary builds the same trie as
+        # inserting the items one at a time
+        inserted = puredict.empty()
+        for k, v in expected.items():
+            inserted = inserted.insert(k, v)
+        f = e.insert('x', 1).delete('x')
+        self.assertEqual(f, e)
+        self.assertEqual(hash(f), hash(e))
+        self.assertEqual(list(hamt.from_dict(expected).items()), list(inserted.items()))
+        self.assertEqual(list(f.items()), list(inserted.items()))
+
+    def test_update(self):
+        a = puredict.puredict((i, i) for i in range(500))
+        changes = dict((i, -i) for i in range(400, 600))
+        b = a.update(changes, x=1)
+        expected = dict(a)
+        expected.update(changes, x=1)
+        self.assertEqual(dict(b.items()), expected)
+        self.assertEqual(len(b), len(expected))
+        self.assertEqual(hash(b), hash(puredict.puredict(expected)))
+        self.assertEqual(a[450], 450)
+        self.assertEqual(a.update([(1, 'a'), (1, 'b')])[1], 'b')
+        self.assertIs(a.update({}), a)
+
+    def test_delete_many(self):
+        a = puredict.puredict((i, i) for i in range(500))
+        b = a.delete_many(range(100, 700, 2))
+        expected = dict((i, i) for i in range(500) if i < 100 or i % 2)
+        self.assertEqual(dict(b.items()), expected)
+        self.assertEqual(len(b), len(expected))
+        self.assertEqual(hash(b), hash(puredict.puredict(expected)))
+        self.assertEqual(len(a.delete_many([1, 1, 1])), 499)
+        self.assertIs(a.delete_many([1000, 1001]), a)
+        self.assertEqual(a.delete_many(range(500)), puredict.empty())
+
+    def test_merge(self):
+        a = puredict.puredict(a=1, b=2)
+        b = puredict.puredict(b=3, c=4)
+        self.assertEqual(a.merge(b), {'a': 1, 'b': 3, 'c': 4})
+        self.assertEqual(a.merge(b, resolve=lambda x, y: x + y), {'a': 1, 'b': 5, 'c': 4})
+        self.assertEqual(a.merge([('a', 5)], resolve=max), {'a': 5, 'b': 2})
+
+    def test_compact(self):
+        e = puredict.empty()
+        for i in range(2000):
+            e = e.insert(i, i).delete(i - 3)
+        self.assertEqual(e.depth(), 1)
+        for i in range(2000):
+            e = e.insert(i, i)
+        self.assertTrue(2 <= e.depth() <= 4)
+        c = e.compact()
+        self.assertEqual(c.depth(), 0)
+        self.assertIs(c.compact(), c)
+        self.assertEqual(c, e)
+        self.assertEqual(hash(c), hash(e))
+        self.assertEqual(len(c), len(e))
+        self.assertEqual(c.insert(5, 'x').delete(5), e.delete(5))
+        self.assertEqual(puredict.empty().depth(), 1)
+
+    def test_pickle(self):
+        import pickle
+        a = puredict.puredict((i, str(i)) for i in range(100))
+        b = a.insert('x', a).delete(5)
+        for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+            for d in (a, b, puredict.empty()):
+                c = pickle.loads(pickle.dumps(d, protocol))
+                self.assertIsInstance(c, puredict.puredict)
+                self.assertEqual(c, d)
+                self.assertEqual(len(c), len(d))
+                self.assertEqual(hash(c), hash(d))
+                self.assertEqual(c.insert(1000, 0), d.insert(1000, 0))
+            self.assertIs(pickle.loads(pickle.dumps(puredict.empty(), protocol)), puredict.empty())
+
+    def test_mmap(self):
+        import os, tempfile
+        directory = tempfile.mkdtemp()
+        a = puredict.puredict((i, str(i)) for i in range(1000))
+        b = a.insert('x', [1, 2]).insert(('t', 1), None).delete(5)
+        for d in (a, b, puredict.empty()):
+            path = os.path.join(directory, 'd')
+            d.save(path)
+            with puredict.open_mmap(path) as m:
+                self.assertEqual(len(m), len(d))
+                self.assertEqual(dict(m.items()), dict(d))
+                self.assertEqual(sorted(m, key=repr), sorted(d, key=repr))
+                self.assertEqual(m, d)
+                for k, v in d.items():
+                    self.assertIn(k, m)
+                    self.assertEqual(m[k], v)
+                for k in (1000, 'y', ('t', 2)):
+                    self.assertNotIn(k, m)
+                    self.assertRaises(KeyError, m.__getitem__, k)
+                self.assertRaises(TypeError, m.__contains__, [1])
+                self.assertRaises(TypeError, m.__getitem__, [1])
+                self.assertEqual(m.get(1000, 'default'), 'default')
+            os.remove(path)
+        s = 'xxx'
+        puredict.puredict([((s, s), 1)]).save(path)
+        with puredict.open_mmap(path) as m:
+            self.assertEqual(m[(''.join('xxx'), ''.join('xxx'))], 1)
+        with open(path, 'wb') as f:
+            f.write(b'not a puredict file')
+        self.assertRaises(ValueError, puredict.open_mmap, path)
+        os.remove(path)
+        os.rmdir(directory)
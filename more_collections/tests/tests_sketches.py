@@ -0,0 +1,112 @@
+from unittest import TestCase
+import pickle
+import random
+from more_collections import approximate_multiset, multiset
+
+class TestApproximateMultiset(TestCase):
+
+    def stream(self, n=20000, seed=0):
+        # a few heavy hitters in a lot of noise
+        rnd = random.Random(seed)
+        return [rnd.choice('abcde') if rnd.random() < 0.3 else rnd.randrange(10**6) for _ in range(n)]
+
+    def test_counts(self):
+        data = self.stream()
+        exact = multiset(data)
+        for ms in (approximate_multiset(data, width=1024, depth=4),
+                approximate_multiset.from_error(0.002, 0.01, data)):
+            self.assertEqual(len(ms), len(data))
+            bound = ms.error_bound()
+            for x in list(exact.distinct())[:2000] + list('abcde'):
+                self.assertGreaterEqual(ms.count(x), exact.count(x))
+                self.assertLessEqual(ms.count(x), exact.count(x) + bound)
+                self.assertIn(x, ms)
+            self.assertEqual(set(x for (x, _) in ms.most_common(5)), set('abcde'))
+            self.assertEqual(ms.most_common(1)[0][0], exact.most_common(1)[0][0])
+
+    def test_update_and_add(self):
+        ms = approximate_multiset(width=64, depth=3, track=2)
+        ms.add('a', 5)
+        ms.add('b')
+        ms.update({'c': 3})
+        ms.update(multiset('cccd'))
+        ms.update(iter('aa'))
+        self.assertEqual(len(ms), 15)
+        self.assertEqual([x for (x, _) in ms.most_common()], ['a', 'c'])
+        self.assertEqual(sorted(ms.distinct()), ['a', 'c'])
+        self.assertEqual(sorted(ms), ['a'] * 7 + ['c'] * 6)
+        self.assertRaises(ValueError, ms.add, 'a', -1)
+        self.assertRaises(ValueError, approximate_multiset, width=100)
+        self.assertEqual(approximate_multiset(track=0, items='ab').most_common(), [])
+
+    def test_update_stream(self):
+        # streams are counted in bounded chunks, not all distinct elements at once
+        try:
+            import tracemalloc
+        except ImportError:
+            tracemalloc = None
+        n = 50000
+        ms, added = approximate_multiset(), approximate_multiset()
+        for x in range(n):
+            added.add(x)
+        if tracemalloc:
+            tracemalloc.start()
+        ms.update(iter(range(n)))
+        if tracemalloc:
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            self.assertLess(peak, 2 * 10**6)
+        self.assertEqual(ms, added)
+        self.assertEqual(len(ms), n)
+        self.assertEqual(sorted(ms.most_common()), sorted(added.most_common()))
+
+    def test_merge(self):
+        a, b = self.stream(seed=1), self.stream(seed=2)
+        sa, sb = approximate_multiset(a), approximate_multiset(b)
+        merged = sa + sb
+        self.assertEqual(merged, approximate_multiset(a + b))
+        self.assertEqual(len(merged), len(a) + len(b))
+        for x in 'abcde':
+            self.assertEqual(merged.count(x), approximate_multiset(a + b).count(x))
+            self.assertGreaterEqual(merged.count(x), sa.count(x) + sb.count(x))
+        self.assertEqual(set(x for (x, _) in merged.most_common(5)), set('abcde'))
+        self.assertRaises(ValueError, sa.__add__, approximate_multiset(width=64))
+        self.assertRaises(ValueError, sa.__add__, approximate_multiset(seed=1))
+        self.assertRaises(TypeError, lambda: sa - sb)
+        self.assertRaises(TypeError, lambda: sa <= sb)
+        for other in (['x'], frozenset('x')):
+            self.assertRaises(TypeError, lambda: other | sa)
+            self.assertRaises(TypeError, lambda: other & sa)
+            self.assertRaises(TypeError, lambda: other - sa)
+            self.assertRaises(TypeError, lambda: other ^ sa)
+        self.assertRaises(TypeError, sa.isdisjoint, ['x'])
+
+    def test_pickle(self):
+        ms = approximate_multiset(self.stream(2000), width=256, depth=3, track=10, seed=3)
+        copy = pickle.loads(pickle.dumps(ms))
+        self.assertEqual(copy, ms)
+        self.assertEqual(len(copy), len(ms))
+        self.assertEqual(copy.most_common(), ms.most_common())
+
+    def test_pickle_across_processes(self):
+        # counters don't depend on the hash seed of the process
+        import os, subprocess, sys, tempfile
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, 'sketch')
+        script = '''if 1:
+            import pickle, sys
+            from more_collections import approximate_multiset, frozenmultiset
+            data = [str(i) for i in range(200)] + [b'x', ('t', 'u'), frozenmultiset('ab'), 7, None]
+            if sys.argv[1] == 'save':
+                with open(sys.argv[2], 'wb') as f:
+                    pickle.dump(approximate_multiset(data, width=4096), f)
+            else:
+                with open(sys.argv[2], 'rb') as f:
+                    ms = pickle.load(f)
+                assert [ms.count(x) for x in data] == [1] * len(data)
+        '''
+        for seed, command in (('1', 'save'), ('2', 'load'), ('3', 'load')):
+            env = dict(os.environ, PYTHONHASHSEED=seed)
+            subprocess.check_call([sys.executable, '-c', script, command, path], env=env)
+        os.remove(path)
+        os.rmdir(directory)